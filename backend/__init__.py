@@ -1,5 +1,17 @@
 import backend.systems.ai
+import backend.systems.assets
 import backend.systems.camera
+import backend.systems.contacts
 import backend.systems.entities
+import backend.systems.particles
 import backend.systems.physics
+import backend.systems.picking
+import backend.systems.profiling
+import backend.systems.rendering
+import backend.systems.replay
+import backend.systems.rotation
+import backend.systems.scenes
+import backend.systems.spatial
 import backend.systems.spritesheets
+import backend.systems.static
+import backend.systems.text
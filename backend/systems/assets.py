@@ -0,0 +1,165 @@
+import os
+
+import pygame
+
+
+class AssetRegistry(object):
+    """
+    Process-wide cache of images, scaled surfaces, masks and sounds
+
+    Everything is keyed by where it came from: an image by its path, a scaled
+    surface by (source, scale) and a region of either, such as a spritesheet
+    cell, by (source, offset, size). Every caller asking for the
+    same thing gets the same shared object, which must not be drawn on.
+    """
+    def __init__(self):
+        self.images = {}  # path -> surface
+        self.sources = {}  # loaded surface -> path
+        self.scaled = {}  # (source key, scale) -> surface
+        self.masks = {}  # surface -> mask
+        self.sounds = {}  # path -> sound
+
+    def image(self, path, scale=1.0, cache_dir=None):
+        """
+        Return the image at path, converted for the display and scaled
+
+        With a cache_dir the scaled image is saved there and loaded back on
+        later runs instead of being scaled again.
+
+        :param path: str
+        :param scale: float
+        :param cache_dir: str
+        :return: pygame.Surface
+        """
+        if scale != 1 and (path, scale) in self.scaled:
+            return self.scaled[path, scale]
+        if scale != 1 and cache_dir is not None:
+            return self.cached_image(path, scale, cache_dir)
+
+        if path not in self.images:
+            self.images[path] = pygame.image.load(path).convert_alpha()
+            self.sources[self.images[path]] = path
+        return self.scale(self.images[path], scale)
+
+    def cached_image(self, path, scale, cache_dir):
+        """
+        Return a scaled image from its copy in cache_dir, saving the copy first if it is missing or out of date
+
+        :param path: str
+        :param scale: float
+        :param cache_dir: str
+        :return: pygame.Surface
+        """
+        name = os.path.splitext(os.path.normpath(path))[0].replace(os.sep, "_")
+        cache_path = os.path.join(cache_dir, f"{name}@{scale}x.png")
+
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            surface = pygame.image.load(cache_path).convert_alpha()
+            self.scaled[path, scale] = surface
+            self.sources[surface] = path, scale
+            return surface
+
+        surface = self.image(path, scale)
+        os.makedirs(cache_dir, exist_ok=True)
+        pygame.image.save(surface, cache_path)
+        return surface
+
+    def scale(self, surface, scale):
+        """
+        Return a surface scaled by a factor, shared with every other request for the same source and scale
+
+        Surfaces that didn't come from the registry have nothing stable to be
+        keyed by, so they are scaled without being cached.
+
+        :param surface: pygame.Surface
+        :param scale: float
+        :return: pygame.Surface
+        """
+        source = self.source_key(surface)
+        if source is None:
+            return pygame.transform.scale(surface, [int(x * scale) for x in surface.get_size()])
+
+        if scale == 1:
+            return surface
+
+        key = source, scale
+        if key not in self.scaled:
+            self.scaled[key] = pygame.transform.scale(surface, [int(x * scale) for x in surface.get_size()])
+            self.sources[self.scaled[key]] = key
+        return self.scaled[key]
+
+    def source_key(self, surface):
+        # where a surface came from: a path, a scaled source or a region of either
+        if surface in self.sources:
+            return self.sources[surface]
+        parent = surface.get_parent()
+        if parent in self.sources:
+            return self.sources[parent], surface.get_offset(), surface.get_size()
+        return None
+
+    def mask(self, surface):
+        """
+        Return the mask of a surface, built once per surface
+
+        :param surface: pygame.Surface
+        :return: pygame.mask.Mask
+        """
+        if surface not in self.masks:
+            self.masks[surface] = pygame.mask.from_surface(surface)
+        return self.masks[surface]
+
+    def sound(self, path):
+        if path not in self.sounds:
+            self.sounds[path] = pygame.mixer.Sound(path)
+        return self.sounds[path]
+
+    def preload(self, images=(), sounds=(), scales=(1.0,)):
+        """
+        Load images at each scale, and sounds, ahead of time
+
+        :param images: list
+        :param sounds: list
+        :param scales: tuple
+        """
+        for path in images:
+            for scale in scales:
+                self.mask(self.image(path, scale))
+        for path in sounds:
+            self.sound(path)
+
+    def memory_usage(self):
+        """
+        Return the approximate bytes held by each kind of asset
+
+        :return: dict
+        """
+        usage = {"images": sum(self.surface_size(surface) for surface in self.images.values()),
+                 "scaled": sum(self.surface_size(surface) for surface in self.scaled.values()),
+                 "masks": sum(width * height // 8 for width, height in (mask.get_size()
+                                                                        for mask in self.masks.values())),
+                 "sounds": int(sum(sound.get_length() * self.sample_rate() for sound in self.sounds.values()))}
+        usage["total"] = sum(usage.values())
+        return usage
+
+    @staticmethod
+    def surface_size(surface):
+        return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+    @staticmethod
+    def sample_rate():
+        # bytes per second of loaded audio in the mixer's format
+        init = pygame.mixer.get_init()
+        if not init:
+            return 0
+        frequency, size, channels = init
+        return frequency * abs(size) // 8 * channels
+
+    def clear(self):
+        self.images.clear()
+        self.sources.clear()
+        self.scaled.clear()
+        self.masks.clear()
+        self.sounds.clear()
+
+
+assets = AssetRegistry()
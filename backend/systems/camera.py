@@ -14,6 +14,44 @@ class Camera(object):
         # applies the camera offset to the target sprite by aligning it's rect with the camera rect
         return target.rect.move(self.state.topleft)
 
+    def apply_interpolated(self, target, alpha):
+        # like apply, but places the target between its rect at the previous and current simulation step
+        previous = getattr(target, "previous_rect", None)
+        if previous is None:
+            return self.apply(target)
+        x = previous.x + (target.rect.x - previous.x) * alpha
+        y = previous.y + (target.rect.y - previous.y) * alpha
+        return pygame.Rect((round(x) + self.state.left, round(y) + self.state.top), target.rect.size)
+
+    def view(self):
+        # the area of the world currently on screen
+        return pygame.Rect((-self.state.left, -self.state.top), self.view_size)
+
+    def cull(self, group):
+        """
+        Return the sprites of a group that are on screen, in the order the group draws them
+
+        Spatially indexed groups only look at the cells under the view, so the
+        cost follows the number of visible sprites rather than the size of the world.
+
+        :param group: pygame.sprite.Group
+        :return: list
+        """
+        view = self.view()
+        if hasattr(group, "query"):
+            return group.query(view, ordered=True)
+        return [sprite for sprite in group if view.colliderect(sprite.rect)]
+
+    def blit_sequence(self, sprites):
+        """
+        Return (image, screen position) pairs for Surface.blits, without building a rect per sprite
+
+        :param sprites: list
+        :return: list
+        """
+        x, y = self.state.topleft
+        return [(sprite.image, (sprite.rect.x + x, sprite.rect.y + y)) for sprite in sprites]
+
     def reverse(self, pos):
         # converts screen coordinates to world coordinates
         return pos[0] - self.state.left, pos[1] - self.state.top
@@ -0,0 +1,212 @@
+from backend.systems.profiling import profiler
+from backend.systems.spatial import candidates
+
+
+def overlap_area(sprite, others):
+    """
+    Return the number of the sprite's pixels covered by any of the others, counting shared pixels once per other
+
+    :param sprite: pygame.sprite.Sprite
+    :param others: list
+    :return: int
+    """
+    others = [other for other in others if other is not sprite and sprite.rect.colliderect(other.rect)]
+    profiler.count("mask tests", len(others))
+    return sum(sprite.mask.overlap_area(other.mask, (other.rect.x - sprite.rect.x, other.rect.y - sprite.rect.y))
+               for other in others)
+
+
+def contact(left, right):
+    """
+    Return (normal x, normal y, depth) to push left out of right, or None if their masks don't overlap
+
+    The normal points from the centre of the overlapping pixels towards the
+    centre of left's pixels, snapped to the nearest axis, and depth is the
+    extent of the overlap along it. Only one overlap mask is built per pair.
+
+    :param left: pygame.sprite.Sprite
+    :param right: pygame.sprite.Sprite
+    :return: tuple
+    """
+    if not left.rect.colliderect(right.rect):
+        return None
+
+    profiler.count("mask tests")
+    offset = right.rect.x - left.rect.x, right.rect.y - left.rect.y
+    if left.mask.overlap(right.mask, offset) is None:
+        return None
+
+    overlap = left.mask.overlap_mask(right.mask, offset)
+    overlap_x, overlap_y = overlap.centroid()
+    left_x, left_y = left.mask.centroid()
+    bounds = overlap.get_bounding_rects()
+    bounds = bounds[0].unionall(bounds[1:])
+
+    dx, dy = left_x - overlap_x, left_y - overlap_y
+    if abs(dx) > abs(dy):
+        return (1 if dx > 0 else -1), 0, bounds.width
+    return 0, (1 if dy > 0 else -1), bounds.height  # straight overlaps are pushed up, against gravity
+
+
+def velocity(sprite):
+    # how fast a sprite is moving on its own, static sprites and resting bodies don't move
+    if not getattr(sprite, "fall", False):
+        return getattr(sprite, "x_vel", 0), 0
+    return getattr(sprite, "x_vel", 0), getattr(sprite, "y_vel", 0)
+
+
+class ContactSolver(object):
+    """
+    Separates overlapping sprites by pushing them apart along their contact normals
+
+    Every overlapping pair is collected in one pass over the frame, then all of
+    them are resolved together over a few iterations. A pair is recomputed
+    before each push, since separating one pair can also separate another.
+
+    Pushes only go into free space inside the world bounds, so a body is never
+    shoved into a third sprite or off the edge of the world. Pairs that can't
+    be separated that way, or that are already moving apart, are left alone,
+    so bodies stuck in a dense pile stop moving and can go to sleep. A pair
+    that couldn't be separated isn't tried again until one of them moves, and
+    bodies buried under more than a few others aren't pushed at all, since
+    there's no free space to push them into and trying costs more the deeper
+    they're buried.
+    """
+    def __init__(self, iterations=4, bounds=None, crowded=8):
+        """
+        :param iterations: int
+        :param bounds: pygame.Rect, the world bodies are kept in, open at the top, None for no limit
+        :param crowded: int, bodies whose rects overlap more obstacles than this are left where they are
+        """
+        self.iterations = iterations
+        self.bounds = bounds
+        self.crowded = crowded
+        self.stuck = {}  # (body, other) -> both rects when they last couldn't be separated
+
+    def collect(self, bodies, obstacles):
+        """
+        Return (body, other, share) for each pair whose rects overlap, other from obstacles, listing each pair once
+
+        Buried bodies are left out, and share is set when other is a body that
+        can take part of the push.
+
+        :param bodies: dict, movable sprites
+        :param obstacles: pygame.sprite.Group
+        :return: list
+        """
+        nearby = {body: candidates(body, obstacles) for body in bodies}
+        free = {body: None for body, others in nearby.items() if len(others) <= self.crowded}  # in the bodies' order
+        pairs = {}
+        for body in free:
+            for other in nearby[body]:
+                if other in free and (other, body) in pairs:
+                    continue
+                pairs[body, other] = other in free
+        return [(body, other, share) for (body, other), share in pairs.items()]
+
+    def solve(self, bodies, obstacles):
+        """
+        Push overlapping bodies out of each other and out of the other obstacles, returning the bodies that moved
+
+        Bodies share a push between them, anything else in obstacles doesn't move.
+
+        :param bodies: iterable of movable sprites
+        :param obstacles: pygame.sprite.Group
+        :return: list
+        """
+        profiler.start("contacts")
+        bodies = dict.fromkeys(bodies)
+        pairs = self.collect(bodies, obstacles)
+        moved = {}
+        start = {body: body.rect.copy() for body in bodies}
+        stuck, self.stuck = self.stuck, {}  # only pairs still touching this frame are remembered
+
+        for _ in range(self.iterations):
+            remaining = []
+            for left, right, share in pairs:
+                rects = tuple(left.rect), tuple(right.rect)
+                if stuck.get((left, right)) == rects:
+                    self.stuck[left, right] = rects
+                    continue
+                found = contact(left, right)
+                if not found or self.separating(left, right, found):
+                    continue
+                pushed = self.separate(left, right, found, share, obstacles)
+                if pushed:
+                    moved.update(dict.fromkeys(pushed))
+                    remaining.append((left, right, share))
+                else:
+                    self.stuck[left, right] = rects
+            profiler.count("contacts", len(remaining))
+            pairs = remaining
+            if not pairs:
+                break
+
+        # pushes can cancel out over the iterations, only bodies that ended up somewhere else have moved
+        moved = [body for body in moved if body.rect != start.get(body)]
+        for body in moved:
+            body.notify_moved()
+        profiler.stop("contacts")
+        return moved
+
+    @staticmethod
+    def separating(left, right, found):
+        # the bodies' own motion is already taking them apart along the normal
+        nx, ny, _ = found
+        (left_x, left_y), (right_x, right_y) = velocity(left), velocity(right)
+        return (left_x - right_x) * nx + (left_y - right_y) * ny > 0
+
+    def separate(self, left, right, found, share, obstacles):
+        """
+        Push a pair apart, returning the sprites that moved
+
+        A shared push is split between both bodies. Failing that, one body
+        takes the whole push along the normal, then straight up out of the
+        pile, each tried at the full depth and then half of it.
+
+        :param left: pygame.sprite.Sprite
+        :param right: pygame.sprite.Sprite
+        :param found: tuple, (normal x, normal y, depth) from contact
+        :param share: bool, whether right can be pushed too
+        :param obstacles: pygame.sprite.Group
+        :return: list
+        """
+        nx, ny, depth = found
+        if share and self.push(right, -nx * (depth // 2), -ny * (depth // 2), obstacles):
+            if self.push(left, nx * (depth - depth // 2), ny * (depth - depth // 2), obstacles):
+                return [left, right]
+            return [right]
+
+        moves = [(left, nx, ny), (left, 0, -1)]
+        if share:
+            moves[1:1] = [(right, -nx, -ny)]
+            moves.append((right, 0, -1))
+        for body, dx, dy in moves:
+            for distance in (depth, depth // 2):
+                if distance and self.push(body, dx * distance, dy * distance, obstacles):
+                    return [body]
+        return []
+
+    def push(self, body, dx, dy, obstacles):
+        """
+        Move a body by (dx, dy) if that doesn't take it further out of the bounds and it ends up overlapping less
+
+        Every accepted push strictly shrinks the total overlap in the world, so
+        the solver always settles instead of bouncing a body squeezed between
+        two others back and forth.
+
+        :return: bool, whether it moved
+        """
+        target = body.rect.move(dx, dy)
+        if self.bounds and ((dx < 0 and target.left < self.bounds.left) or
+                            (dx > 0 and target.right > self.bounds.right) or
+                            (dy > 0 and target.bottom > self.bounds.bottom)):
+            return False
+
+        nearby = candidates(body, obstacles, body.rect.union(target))
+        before = overlap_area(body, nearby)
+        body.rect.move_ip(dx, dy)
+        if overlap_area(body, nearby) >= before:
+            body.rect.move_ip(-dx, -dy)
+            return False
+        return True
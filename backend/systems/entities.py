@@ -1,27 +1,19 @@
 import math
-from random import gauss, randint
+from random import gauss
 
 import pygame
 
-from pygame.math import Vector2
+from backend.systems.assets import assets
+from backend.systems.particles import particle_pool
+from backend.systems.profiling import profiler
+from backend.systems.rotation import rotation_cache
+from backend.systems.spatial import candidates
 
 
-def collision_normal(left_mask, right_mask, left_rect, right_rect):
-    left_pos = Vector2(left_rect.x, left_rect.y)
-    right_pos = Vector2(right_rect.x, right_rect.y)
-
-    offset = Vector2(list(map(int, left_pos - right_pos)))
-    overlap = left_mask.overlap_area(right_mask, list(map(int, offset)))
-
-    if not overlap:
-        return
-
-    nx = (left_mask.overlap_area(right_mask, list(map(int, Vector2(offset.x + 1, offset.y)))) -
-          left_mask.overlap_area(right_mask, list(map(int, Vector2(offset.x - 1, offset.y)))))
-    ny = (left_mask.overlap_area(right_mask, list(map(int, Vector2(offset.x, offset.y + 1)))) -
-          left_mask.overlap_area(right_mask, list(map(int, Vector2(offset.x, offset.y - 1)))))
-
-    return Vector2(nx, ny)
+def collide_mask(left, right):
+    # pygame.sprite.collide_mask, counted by the profiler
+    profiler.count("mask tests")
+    return pygame.sprite.collide_mask(left, right)
 
 
 def gaussian(mu, inverse_scale):
@@ -40,11 +32,12 @@ def linear_conversion(old_value, old_range, new_range):
 
 
 def load_sprites(sprite_paths, scale):
+    # images come from the shared registry, so each file and scale is only loaded and scaled once
     for name, path in sprite_paths.items():
         if type(path) is str:
-            sprite_paths[name] = pygame.image.load(path).convert_alpha()
-        sprite_paths[name] = pygame.transform.scale(sprite_paths[name],
-                                                    [int(x * scale) for x in sprite_paths[name].get_size()])
+            sprite_paths[name] = assets.image(path, scale)
+        else:
+            sprite_paths[name] = assets.scale(path, scale)
     return sprite_paths
 
 
@@ -54,20 +47,38 @@ class StaticSprite(pygame.sprite.Sprite):
 
     Adds automatic image loading from files
     """
+    swept = False  # resolve movement with check_collisions_swept instead of the one pixel backoff
 
     def __init__(self, x, y, sprite_paths=None, scale=1.0):
         super(StaticSprite, self).__init__()
+        self.dirty = True  # needs redrawing by a DirtyRenderer
 
         if sprite_paths:
             self.sprites = load_sprites(sprite_paths, scale)
             self.sprites["no_rotation"] = self.sprites["base"]
             self.image = self.sprites["base"]
             self.rect = pygame.Rect((x, y), self.image.get_size())
-            self.mask = pygame.mask.from_surface(self.image)
+            self.mask = assets.mask(self.image)
         else:
             self.rect = pygame.Rect((x, y), (8, 8))
 
     def check_collisions(self, offset, index, obstacles):
+        """
+        Move offset pixels along one axis, stopping at the first obstacle.
+        Returns False if the movement was cut short.
+
+        Uses check_collisions_swept for sprites with swept set and
+        check_collisions_backoff otherwise.
+        """
+        profiler.start("collisions")
+        if self.swept:
+            unaltered = self.check_collisions_swept(offset, index, obstacles)
+        else:
+            unaltered = self.check_collisions_backoff(offset, index, obstacles)
+        profiler.stop("collisions")
+        return unaltered
+
+    def check_collisions_backoff(self, offset, index, obstacles):
         """
         This function checks if a collision would occur after moving offset
         pixels.  If a collision is detected position is decremented by one
@@ -76,18 +87,73 @@ class StaticSprite(pygame.sprite.Sprite):
         """
         unaltered = True
         self.rect.move_ip(offset)
-        collisions = pygame.sprite.spritecollide(self, obstacles, False)
-        if self in collisions:
-            collisions.remove(self)
+        collisions = candidates(self, obstacles)
 
-        current_collision = pygame.sprite.spritecollideany(self, collisions, pygame.sprite.collide_mask)
+        current_collision = pygame.sprite.spritecollideany(self, collisions, collide_mask)
         while current_collision:
             self.rect[index] += (1 if offset[index] < 0 else -1)
 
             unaltered = False
-            current_collision = pygame.sprite.spritecollideany(self, collisions, pygame.sprite.collide_mask)
+            current_collision = pygame.sprite.spritecollideany(self, collisions, collide_mask)
+
+        self.notify_moved()
         return unaltered
 
+    def check_collisions_swept(self, offset, index, obstacles):
+        """
+        Continuous version of check_collisions. Everything along the path is
+        gathered in one broadphase query, the path is sampled no further apart
+        than the thinnest sprite involved so nothing can be skipped over, and
+        the exact time of impact is found by bisecting between the last free
+        and first blocked sample. Falls back to check_collisions_backoff if the
+        sprite is already overlapping something before it moves.
+        """
+        distance = int(offset[index])
+        start = self.rect[index]
+        collisions = candidates(self, obstacles, self.rect.union(self.rect.move(offset)))
+
+        def blocked(position):
+            self.rect[index] = position
+            return pygame.sprite.spritecollideany(self, collisions, collide_mask)
+
+        if not distance or blocked(start):
+            self.rect[index] = start
+            return self.check_collisions_backoff(offset, index, obstacles)
+
+        direction = 1 if distance > 0 else -1
+        step = max(1, min([self.rect.size[index]] + [sprite.rect.size[index] for sprite in collisions]) // 2)
+
+        free, hit = start, None
+        for travelled in list(range(step, abs(distance), step)) + [abs(distance)]:
+            position = start + direction * travelled
+            if blocked(position):
+                hit = position
+                break
+            free = position
+
+        if hit is None:
+            self.notify_moved()
+            return True
+
+        while abs(hit - free) > 1:
+            middle = free + (hit - free) // 2 if direction > 0 else free - (free - hit) // 2
+            if blocked(middle):
+                hit = middle
+            else:
+                free = middle
+
+        self.rect[index] = free
+        self.notify_moved()
+        return False
+
+    def notify_moved(self):
+        # let groups that track geometry (e.g. spatial indexes) know the rect has changed
+        self.dirty = True
+        for group in self.groups():
+            sprite_moved = getattr(group, "sprite_moved", None)
+            if sprite_moved:
+                sprite_moved(self)
+
     def get_hit_box(self):
         return self.rect
 
@@ -110,13 +176,13 @@ class DynamicSprite(StaticSprite):
     def rotate(self, angle):
         center = self.rect.center  # save old center
 
-        self.image = pygame.transform.rotate(self.sprites["no_rotation"], angle)  # rotate image
+        # rotated image, its rect around the centre and its mask come from the shared cache
+        self.image, rect, self.mask = rotation_cache.get(self.sprites["no_rotation"], angle)
 
-        self.rect = self.image.get_rect()  # set rect to new image's dimensions
-        self.rect.center = center  # reset center, keep image from moving
+        self.rect = rect.move(center)  # set rect to new image's dimensions, keep image from moving
 
         self.angle = angle % 360  # update angle
-        self.mask = pygame.mask.from_surface(self.image)  # update mask
+        self.notify_moved()
 
     def move(self, dx, dy, colliders):
         if dx != 0:
@@ -154,7 +220,7 @@ class LivingSprite(DynamicSprite):
         self.run_particles = run_particles
 
         if self.run_particles:
-            self.particles = pygame.sprite.Group()
+            self.particles = particle_pool
 
             self.particle_rgb = (200, 25, 25)
             self.particle_duration = 50
@@ -179,11 +245,10 @@ class LivingSprite(DynamicSprite):
             num_particles = gaussian(self.hurt_blood, 4)
 
         if self.run_particles:
-            self.particles.add(
-                *[Particle(self.rect.centerx, self.rect.centery, self.particle_rgb, self.particle_duration,
-                           self.particle_variation) for _ in range(num_particles)])
+            self.particles.emit(self.rect.centerx, self.rect.centery, num_particles, self.particle_rgb,
+                                self.particle_duration, self.particle_variation)
 
-    def update(self, colliders, surface, cam):
+    def update(self, colliders, surface, cam, dt=None):
         if self.hurt_bool and self.hurt_time > 0:
             self.hurt_time -= 1
         elif self.hurt_bool:
@@ -192,45 +257,8 @@ class LivingSprite(DynamicSprite):
             self.hurt_bool = False
             self.hurt_time = self.base_hurt_time
 
-        if self.run_particles:
-            self.particles.update(colliders, surface, cam)
-            if self.health <= 0 and len(self.particles) == 0:
-                self.kill()
-        elif self.health <= 0:
-            self.kill()
-
-
-class Particle(DynamicSprite):
-    """
-    Basic particle class with automatic random motion, built in timer with random distribution, and colour variation
-    """
-
-    def __init__(self, x, y, rgb, duration, seed):
-        super(Particle, self).__init__(x, y)
-
-        self.rgb = (clamp(gaussian(rgb[0], seed), 0, 255),
-                    clamp(gaussian(rgb[1], seed), 0, 255),
-                    clamp(gaussian(rgb[2], seed), 0, 255))
-        self.duration = gaussian(duration, seed)
-        self.move_gen = self.move_random(seed)
-
-    @staticmethod
-    def move_random(mag):
-        for _ in range(randint(-mag, mag)):
-            x = randint(-mag, mag)
-            y = randint(-mag, mag)
-            yield (x, y)
-
-    def update(self, colliders, surface, cam):
-        if self.duration > 0:
-            try:
-                self.move(*next(self.move_gen), colliders)
-            except StopIteration:
-                pass
-            finally:
-                pygame.draw.rect(surface, self.rgb, cam.apply(self))
-            self.duration -= 1
-        else:
+        # particles live on in the shared pool, which is updated and drawn once per frame for every sprite
+        if self.health <= 0:
             self.kill()
 
 
@@ -0,0 +1,132 @@
+import numpy
+import pygame
+
+
+class ParticlePool(object):
+    """
+    Fixed capacity particle system stored in NumPy arrays
+
+    Particles are rows of preallocated position, velocity, colour and lifetime
+    arrays. Spawning takes slots from a free list and expiring returns them, so
+    no Python objects are created per particle. All live particles are moved
+    in one vectorized step and drawn in one batch.
+
+    Motion matches the old Particle sprite: a particle jitters by a random
+    offset of up to its variation each frame for a random number of frames,
+    then stays put until its lifetime runs out.
+    """
+    def __init__(self, capacity=4096, size=8, seed=None):
+        self.capacity = capacity
+        self.size = size  # side of the square drawn for each particle
+        self.rng = numpy.random.default_rng(seed)
+
+        self.position = numpy.zeros((capacity, 2), numpy.float64)
+        self.velocity = numpy.zeros((capacity, 2), numpy.float64)
+        self.colour = numpy.zeros((capacity, 3), numpy.uint8)
+        self.life = numpy.zeros(capacity, numpy.int32)  # frames left to live
+        self.moves = numpy.zeros(capacity, numpy.int32)  # frames of jitter left
+        self.variation = numpy.zeros(capacity, numpy.int32)
+        self.active = numpy.zeros(capacity, bool)
+
+        self.free = numpy.arange(capacity)[::-1].copy()  # stack of unused slots
+        self.free_count = capacity
+
+    def __len__(self):
+        return self.capacity - self.free_count
+
+    def seed(self, seed):
+        self.rng = numpy.random.default_rng(seed)
+
+    def emit(self, x, y, count, rgb, duration, variation):
+        """
+        Spawn up to count particles at (x, y), returning how many fit in the pool
+
+        Colour and duration are drawn from gaussians with standard deviation value / variation.
+
+        :param x: int
+        :param y: int
+        :param count: int
+        :param rgb: tuple
+        :param duration: int
+        :param variation: int
+        :return: int
+        """
+        count = min(count, self.free_count)
+        if count <= 0:
+            return 0
+
+        slots = self.free[self.free_count - count:self.free_count]
+        self.free_count -= count
+
+        rgb = numpy.asarray(rgb, numpy.float64)
+        self.position[slots] = x, y
+        self.velocity[slots] = 0
+        self.colour[slots] = numpy.clip(self.rng.normal(rgb, numpy.round(rgb / variation), (count, 3)), 0, 255)
+        self.life[slots] = self.rng.normal(duration, round(duration / variation), count)
+        self.moves[slots] = self.rng.integers(-variation, variation + 1, count)
+        self.variation[slots] = variation
+        self.active[slots] = True
+        return count
+
+    def update(self):
+        moving = numpy.flatnonzero(self.active & (self.moves > 0))
+        if len(moving):
+            variation = self.variation[moving, numpy.newaxis]
+            self.velocity[moving] = self.rng.integers(-variation, variation + 1, (len(moving), 2))
+            self.position[moving] += self.velocity[moving]
+            self.moves[moving] -= 1
+
+        self.life[self.active] -= 1
+        self.release(numpy.flatnonzero(self.active & (self.life < 0)))
+
+    def release(self, slots):
+        self.active[slots] = False
+        self.free[self.free_count:self.free_count + len(slots)] = slots
+        self.free_count += len(slots)
+
+    def clear(self):
+        self.release(numpy.flatnonzero(self.active))
+
+    def bounds(self, offset=(0, 0)):
+        """
+        Return the screen rectangle covering every live particle, or None if there are none
+
+        :param offset: tuple
+        :return: pygame.Rect
+        """
+        if not len(self):
+            return None
+        position = self.position[self.active]
+        left, top = position.min(axis=0).astype(int)
+        right, bottom = position.max(axis=0).astype(int) + self.size
+        return pygame.Rect(left + offset[0], top + offset[1], right - left, bottom - top)
+
+    def draw(self, surface, offset=(0, 0)):
+        """
+        Draw every live particle as a square in a single write to the surface's pixels
+
+        Particles that are partly off the surface are skipped.
+
+        :param surface: pygame.Surface
+        :param offset: tuple
+        """
+        if not len(self):
+            return
+
+        slots = numpy.flatnonzero(self.active)
+        corner = self.position[slots].astype(int) + offset
+        width, height = surface.get_size()
+        inside = ((corner[:, 0] >= 0) & (corner[:, 1] >= 0) &
+                  (corner[:, 0] <= width - self.size) & (corner[:, 1] <= height - self.size))
+        corner, colour = corner[inside], self.colour[slots[inside]]
+
+        square = numpy.arange(self.size)
+        xs = (corner[:, 0, numpy.newaxis] + square)[:, :, numpy.newaxis]
+        ys = (corner[:, 1, numpy.newaxis] + square)[:, numpy.newaxis, :]
+
+        pixels = pygame.surfarray.pixels3d(surface)
+        pixels[xs, ys] = colour[:, numpy.newaxis, numpy.newaxis, :]
+        del pixels  # unlock the surface
+
+
+particle_pool = ParticlePool()
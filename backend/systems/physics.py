@@ -2,6 +2,12 @@ import pygame
 
 import pygame.math
 
+from backend.systems.entities import collide_mask
+from backend.systems.profiling import profiler
+from backend.systems.spatial import candidates
+
+TIMESTEP = 1 / 60  # seconds of simulated time per physics step
+
 
 class PhysicsMixin(object):
     """
@@ -17,23 +23,69 @@ class PhysicsMixin(object):
         self.fall = False
         self.time = None
 
-    def physics_update(self):
-        """If the player is falling, calculate current y velocity."""
+        # sleeping bodies skip simulation until something disturbs them
+        self.sleeping = False
+        self.idle_frames = 0
+        self.sleep_threshold = 30
+        self.last_rect = None
+
+    def physics_update(self, dt=TIMESTEP):
+        """
+        If the player is falling, calculate current y velocity.
+
+        Time spent falling is accumulated from the fixed step dt rather than
+        read from the clock, so the result doesn't depend on frame rate.
+        """
         if self.fall:
-            time_now = pygame.time.get_ticks()
-            if not self.time:
-                self.time = time_now
-            self.y_vel = self.grav*((time_now-self.time)/1000.0)+self.y_vel_i
+            if self.time is None:
+                self.time = 0.0
+            else:
+                self.time += dt
+            self.y_vel = self.grav*self.time+self.y_vel_i
         else:
             self.time = None
             self.y_vel = self.y_vel_i = 0
 
     def check_falling(self, obstacles):
         """If player is not contacting the ground, enter fall state."""
+        profiler.start("falling")
         self.rect.move_ip((0, 1))
-        collisions = pygame.sprite.spritecollide(self, obstacles, False)
-        if self in collisions:
-            collisions.remove(self)
-        if not pygame.sprite.spritecollideany(self, collisions, pygame.sprite.collide_mask):
+        collisions = candidates(self, obstacles)
+        if not pygame.sprite.spritecollideany(self, collisions, collide_mask):
             self.fall = True
         self.rect.move_ip((0, -1))
+        profiler.stop("falling")
+
+    def settle(self, moved):
+        """Count frames spent at rest and put the body to sleep once it has rested long enough."""
+        if moved or self.fall:
+            self.idle_frames = 0
+        else:
+            self.idle_frames += 1
+            if self.idle_frames >= self.sleep_threshold:
+                self.sleeping = True
+
+    def wake(self):
+        self.sleeping = False
+        self.idle_frames = 0
+
+    def wake_area(self, area):
+        """Wake this body and every sleeping body touching area, found through any spatially indexed groups."""
+        self.wake()
+        area = area.inflate(2, 2)  # include bodies resting against the edges
+        for group in self.groups():
+            if hasattr(group, "query"):
+                for sprite in candidates(self, group, area):
+                    if getattr(sprite, "sleeping", False):
+                        sprite.wake()
+
+    def notify_moved(self):
+        """Wake anything touching the space the body moved out of or into."""
+        super(PhysicsMixin, self).notify_moved()
+        if self.rect != self.last_rect:
+            self.wake_area(self.rect if self.last_rect is None else self.rect.union(self.last_rect))
+            self.last_rect = self.rect.copy()
+
+    def rotate(self, angle):
+        super(PhysicsMixin, self).rotate(angle)
+        self.wake_area(self.rect)  # the shape changed even if the rect didn't
@@ -0,0 +1,76 @@
+import pygame
+
+
+def hit(sprite, pos):
+    """
+    Return whether a point lands on one of the sprite's opaque pixels, or just its rect if it has no mask
+
+    :param sprite: pygame.sprite.Sprite
+    :param pos: tuple
+    :return: bool
+    """
+    if not sprite.rect.collidepoint(pos):
+        return False
+    mask = getattr(sprite, "mask", None)
+    if mask is None:
+        return True
+    return bool(mask.get_at((pos[0] - sprite.rect.x, pos[1] - sprite.rect.y)))
+
+
+def pick(group, pos, among=None):
+    """
+    Return the topmost sprite of a group drawn at a point, optionally only considering members of another group
+
+    Spatially indexed groups only look at the one cell under the point. The
+    candidates are tested top to bottom in draw order, so transparent corners
+    let clicks through to whatever is drawn underneath.
+
+    :param group: pygame.sprite.Group
+    :param pos: tuple
+    :param among: pygame.sprite.Group
+    :return: pygame.sprite.Sprite
+    """
+    if hasattr(group, "query"):
+        found = group.query(pygame.Rect(pos, (1, 1)), ordered=True)
+    else:
+        found = [sprite for sprite in group if sprite.rect.collidepoint(pos)]
+
+    for sprite in reversed(found):
+        if (among is None or sprite in among) and hit(sprite, pos):
+            return sprite
+    return None
+
+
+class Picker(object):
+    """
+    Keeps track of the sprite under the mouse from MOUSEMOTION events
+
+    Sprites with a hover method are told when the mouse moves onto or off
+    them, so they don't have to poll the mouse every frame.
+    """
+    def __init__(self, group, pos=(0, 0)):
+        self.group = group
+        self.pos = pos
+        self.hovered = None
+
+    def handle_event(self, event):
+        if event.type == pygame.MOUSEMOTION:
+            self.move(event.pos)
+
+    def move(self, pos):
+        self.pos = pos
+        self.refresh()
+
+    def refresh(self):
+        # pick again at the last position, for when sprites appear or move under a still mouse
+        hovered = self.pick(self.pos)
+        if hovered is self.hovered:
+            return
+        if self.hovered is not None and hasattr(self.hovered, "hover"):
+            self.hovered.hover(False)
+        if hovered is not None and hasattr(hovered, "hover"):
+            hovered.hover(True)
+        self.hovered = hovered
+
+    def pick(self, pos, among=None):
+        return pick(self.group, pos, among)
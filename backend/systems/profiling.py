@@ -0,0 +1,156 @@
+import csv
+import json
+from collections import deque
+from time import perf_counter
+
+import pygame
+
+
+class Profiler(object):
+    """
+    Per-frame named timers and counters
+
+    Code under measurement calls start/stop around sections and count for
+    events such as mask tests. Everything returns immediately while the
+    profiler is disabled. end_frame closes the frame, keeps it in a short
+    history for the overlay and optionally streams it to a JSONL or CSV file.
+    """
+    def __init__(self, history=180):
+        self.enabled = False
+        self.frames = deque(maxlen=history)
+        self.frame_number = 0
+
+        self.timings = {}
+        self.counts = {}
+        self.starts = {}
+        self.frame_start = None
+
+        self.stream = None
+        self.writer = None
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        self.timings, self.counts, self.starts = {}, {}, {}
+        self.frame_start = perf_counter() if enabled else None
+
+    def start(self, name):
+        if self.enabled:
+            self.starts[name] = perf_counter()
+
+    def stop(self, name):
+        if self.enabled:
+            start = self.starts.pop(name, None)
+            if start is not None:  # may have been enabled halfway through the section
+                self.timings[name] = self.timings.get(name, 0.0) + perf_counter() - start
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def end_frame(self):
+        """
+        Close the current frame and return its record, or None if disabled
+
+        :return: dict
+        """
+        if not self.enabled:
+            return None
+
+        now = perf_counter()
+        record = {"frame": self.frame_number, "frame_time": now - self.frame_start,
+                  "timings": self.timings, "counts": self.counts}
+        self.frames.append(record)
+        if self.stream:
+            self.write(record)
+
+        self.frame_number += 1
+        self.timings, self.counts = {}, {}
+        self.frame_start = now
+        return record
+
+    def open_stream(self, path):
+        """
+        Stream every frame to a file, as JSON lines or, for .csv paths, one (frame, kind, name, value) row per entry
+
+        :param path: str
+        """
+        self.close_stream()
+        self.stream = open(path, "w", newline="")
+        if path.endswith(".csv"):
+            self.writer = csv.writer(self.stream)
+            self.writer.writerow(("frame", "kind", "name", "value"))
+
+    def close_stream(self):
+        if self.stream:
+            self.stream.close()
+        self.stream = self.writer = None
+
+    def write(self, record):
+        if self.writer:
+            frame = record["frame"]
+            self.writer.writerow((frame, "time", "frame", record["frame_time"]))
+            self.writer.writerows((frame, "time", name, value) for name, value in record["timings"].items())
+            self.writer.writerows((frame, "count", name, value) for name, value in record["counts"].items())
+        else:
+            self.stream.write(json.dumps(record) + "\n")
+
+    def top_costs(self, n=5):
+        """
+        Return the n most expensive timers as (name, average milliseconds per frame) over the history
+
+        :param n: int
+        :return: list
+        """
+        totals = {}
+        for record in self.frames:
+            for name, value in record["timings"].items():
+                totals[name] = totals.get(name, 0.0) + value
+        frames = max(1, len(self.frames))
+        return sorted(((name, total * 1000 / frames) for name, total in totals.items()),
+                      key=lambda item: item[1], reverse=True)[:n]
+
+
+class ProfilerOverlay(object):
+    """
+    Frame time graph with the top costs and last frame's counters, drawn from a Profiler's history
+    """
+    def __init__(self, profiler, size=(360, 200), budget=1 / 60):
+        self.profiler = profiler
+        self.size = size
+        self.budget = budget  # frame time drawn as the reference line
+        self.font = pygame.font.Font(None, 20)
+        self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        self.dirty = True  # contents change every frame, tell a DirtyRenderer to redraw it
+
+    def render(self):
+        """
+        Redraw the overlay and return its surface
+
+        :return: pygame.Surface
+        """
+        self.dirty = True
+        width, height = self.size
+        graph_height = height // 2
+        self.surface.fill((0, 0, 0, 160))
+
+        scale = graph_height / (self.budget * 2)
+        frames = list(self.profiler.frames)[-width:]
+        for x, record in enumerate(frames):
+            bar = min(graph_height, int(record["frame_time"] * scale))
+            color = (90, 220, 90) if record["frame_time"] <= self.budget else (230, 80, 60)
+            pygame.draw.line(self.surface, color, (x, graph_height), (x, graph_height - bar))
+        budget_y = graph_height - int(self.budget * scale)
+        pygame.draw.line(self.surface, (255, 255, 255), (0, budget_y), (width, budget_y))
+
+        lines = [f"{name}: {cost:.2f} ms" for name, cost in self.profiler.top_costs()]
+        if frames:
+            lines.append(", ".join(f"{name} {value}" for name, value in sorted(frames[-1]["counts"].items())))
+
+        y = graph_height + 4
+        for line in lines:
+            self.surface.blit(self.font.render(line, True, (255, 255, 255)), (4, y))
+            y += self.font.get_linesize()
+        return self.surface
+
+
+profiler = Profiler()
@@ -0,0 +1,98 @@
+import pygame
+
+
+def merge_rects(rects):
+    """
+    Union overlapping rectangles so no area gets redrawn twice
+
+    :param rects: list
+    :return: list
+    """
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        i = 0
+        while i < len(merged):
+            if rect.colliderect(merged[i]):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
+
+
+class DirtyRenderer(object):
+    """
+    Redraw only the parts of the screen that changed since the last frame
+
+    Each frame is described as a back-to-front list of (key, image, rect).
+    An item is dirty if it is new, gone, moved, drew a different image, or
+    its key has a truthy dirty attribute (sprites set this themselves when
+    they move or rotate). Dirty areas are cleared to the background and every
+    item touching them is redrawn, clipped to the area. The returned rects are
+    meant for pygame.display.update.
+    """
+    def __init__(self, background):
+        self.background = background  # fill colour or a surface the size of the screen
+        self.previous = {}
+        self.full_redraw = True
+        self.debug = False
+        self.debug_rects = []
+
+    def invalidate(self):
+        # redraw everything next frame, e.g. after switching from full redraws
+        self.full_redraw = True
+
+    def draw(self, surface, items, extra=()):
+        """
+        Draw the frame and return the regions of the surface that changed
+
+        Rects in extra are redrawn as well, for things drawn outside the renderer.
+
+        :param surface: pygame.Surface
+        :param items: list
+        :param extra: list
+        :return: list
+        """
+        current = {}
+        dirty = list(self.debug_rects) + [rect for rect in extra if rect]
+        for key, image, rect in items:
+            current[key] = image, rect
+            previous = self.previous.get(key)
+            if previous is None or previous[0] is not image or previous[1] != rect or getattr(key, "dirty", False):
+                dirty.append(rect)
+                if previous:
+                    dirty.append(previous[1])
+            if getattr(key, "dirty", False):
+                key.dirty = False
+
+        for key, (_, rect) in self.previous.items():
+            if key not in current:
+                dirty.append(rect)
+        self.previous = current
+
+        screen = surface.get_rect()
+        if self.full_redraw:
+            dirty = [screen]
+            self.full_redraw = False
+        else:
+            dirty = [rect for rect in merge_rects(rect.clip(screen) for rect in dirty) if rect.width and rect.height]
+
+        for area in dirty:
+            surface.set_clip(area)
+            self.clear(surface, area)
+            surface.blits([(image, rect) for _, image, rect in items if area.colliderect(rect)], False)
+        surface.set_clip(None)
+
+        self.debug_rects = []
+        if self.debug:
+            for area in dirty:
+                self.debug_rects.append(pygame.draw.rect(surface, (255, 0, 255), area, 1))
+        return dirty
+
+    def clear(self, surface, area):
+        if isinstance(self.background, pygame.Surface):
+            surface.blit(self.background, area, area)
+        else:
+            surface.fill(self.background, area)
@@ -0,0 +1,112 @@
+import gzip
+import json
+
+import pygame
+
+# event attributes worth keeping, everything else about an event is dropped when recording
+EVENT_ATTRIBUTES = "key", "button", "pos"
+
+
+class KeyState(object):
+    """
+    Stands in for pygame.key.get_pressed() during a replay
+    """
+    def __init__(self, pressed=()):
+        self.pressed = frozenset(pressed)
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+class Recorder(object):
+    """
+    Writes everything a session depends on to a gzipped JSON lines file
+
+    The first line holds the seed and display settings, then each frame is a
+    line with the number of simulation steps it ran, the mouse position, the
+    tracked keys held down and the events handled. Frames with no keys or
+    events are just [steps, x, y]. A last line records how the session
+    ended, so a replay can check it came out the same.
+    """
+    def __init__(self, path, header, keys, event_types):
+        """
+        :param path: str
+        :param header: dict, e.g. seed, resolution and sprite scale
+        :param keys: tuple, key constants whose state is recorded every frame
+        :param event_types: tuple, event types the game handles, others aren't recorded
+        """
+        self.file = gzip.open(path, "wt")
+        self.keys = keys
+        self.event_types = frozenset(event_types)
+        self.frames = 0
+        self.write(dict(header, version=1, keys=list(keys)))
+
+    def write(self, line):
+        self.file.write(json.dumps(line, separators=(",", ":")) + "\n")
+
+    def record(self, steps, mouse_pos, keys, events):
+        """
+        :param steps: int
+        :param mouse_pos: tuple
+        :param keys: pygame.key.ScancodeWrapper
+        :param events: list
+        """
+        frame = [steps, mouse_pos[0], mouse_pos[1]]
+        pressed = [key for key in self.keys if keys[key]]
+        recorded = [[event.type, {name: getattr(event, name) for name in EVENT_ATTRIBUTES if hasattr(event, name)}]
+                    for event in events if event.type in self.event_types]
+        if pressed or recorded:
+            frame.extend((pressed, recorded))
+        self.write(frame)
+        self.frames += 1
+
+    def close(self, summary=None):
+        self.write({"end": dict(summary or {}, frames=self.frames)})
+        self.file.close()
+
+
+class Replay(object):
+    """
+    Reads a Recorder file back one frame at a time
+    """
+    def __init__(self, path):
+        self.file = gzip.open(path, "rt")
+        self.header = json.loads(self.file.readline())
+        self.summary = None
+        self.frames = 0
+
+    @property
+    def seed(self):
+        return self.header["seed"]
+
+    def next_frame(self):
+        """
+        Return the next frame as (steps, mouse position, KeyState, events), or None at the end
+
+        :return: tuple
+        """
+        line = self.file.readline()
+        frame = json.loads(line) if line else None
+        if not isinstance(frame, list):
+            self.summary = frame["end"] if frame else None
+            return None
+
+        self.frames += 1
+        steps, x, y = frame[:3]
+        pressed, events = frame[3:] if len(frame) > 3 else ((), ())
+        return (steps, (x, y), KeyState(pressed),
+                [pygame.event.Event(event_type, {name: tuple(value) if name == "pos" else value
+                                                 for name, value in attributes.items()})
+                 for event_type, attributes in events])
+
+    def matches(self, summary):
+        """
+        Return whether a session ended the way the recording did, once the replay has been read to the end
+
+        :param summary: dict
+        :return: bool
+        """
+        return self.summary == dict(summary, frames=self.frames)
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,75 @@
+from collections import OrderedDict
+
+import pygame
+
+from backend.systems.profiling import profiler
+
+
+class RotationCache(object):
+    """
+    Least recently used cache of rotated images
+
+    Entries are keyed by (source image, quantized angle) and hold the rotated
+    surface, its rect relative to the image centre and its mask, so every
+    sprite drawing the same source image shares one copy of each rotation.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, resolution=1):
+        self.max_bytes = max_bytes
+        self.resolution = resolution  # degrees between cached angles
+
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def quantize(self, angle):
+        return round(angle / self.resolution) * self.resolution % 360
+
+    def get(self, image, angle):
+        """
+        Return the (surface, rect, mask) of an image rotated by angle, rect being centred on (0, 0)
+
+        :param image: pygame.Surface
+        :param angle: float
+        :return: tuple
+        """
+        key = (image, self.quantize(angle))
+        entry = self.entries.get(key)
+        if entry:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        profiler.count("surfaces")
+        rotated = pygame.transform.rotate(image, key[1])
+        entry = rotated, rotated.get_rect(center=(0, 0)), pygame.mask.from_surface(rotated)
+
+        self.entries[key] = entry
+        self.bytes += self.entry_size(entry)
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= self.entry_size(evicted)
+        return entry
+
+    def warm(self, image, step=5):
+        """
+        Prebuild every rotation of an image at step degree intervals
+
+        :param image: pygame.Surface
+        :param step: int
+        """
+        for angle in range(0, 360, step):
+            self.get(image, angle)
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    @staticmethod
+    def entry_size(entry):
+        surface, rect, _ = entry
+        return rect.width * rect.height * surface.get_bytesize() + rect.width * rect.height // 8
+
+
+rotation_cache = RotationCache()
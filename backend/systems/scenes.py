@@ -0,0 +1,84 @@
+class SceneMachine(object):
+    """
+    Tracks which scene the game is in and the transitions between them
+
+    Each scene can register enter and exit callbacks. A transition can be
+    scheduled to happen after a delay or when an event arrives, whichever comes
+    first, so the main loop keeps running while it waits instead of blocking.
+    """
+    def __init__(self):
+        self.state = None
+        self.handlers = {}
+
+        # pending transition: next state, seconds left (None to wait forever) and event type to wait for
+        self.next_state = None
+        self.remaining = None
+        self.event_type = None
+
+    def register(self, state, enter=None, exit=None):
+        """
+        Set the callbacks run when entering and leaving a scene
+
+        :param state: hashable
+        :param enter: callable
+        :param exit: callable
+        """
+        self.handlers[state] = enter, exit
+
+    def change(self, state):
+        """
+        Leave the current scene and enter another one straight away, cancelling any pending transition
+
+        :param state: hashable
+        """
+        self.cancel()
+
+        exit = self.handlers.get(self.state, (None, None))[1]
+        if exit:
+            exit()
+        self.state = state
+        enter = self.handlers.get(state, (None, None))[0]
+        if enter:
+            enter()
+
+    def after(self, state, duration=None, event_type=None):
+        """
+        Change to a scene once duration seconds have passed or an event of event_type is seen
+
+        :param state: hashable
+        :param duration: float
+        :param event_type: int
+        """
+        self.next_state = state
+        self.remaining = duration
+        self.event_type = event_type
+
+    def cancel(self):
+        self.next_state = None
+        self.remaining = None
+        self.event_type = None
+
+    @property
+    def waiting(self):
+        return self.next_state is not None
+
+    def handle_event(self, event):
+        """
+        Finish the pending transition if it was waiting on this event
+
+        :param event: pygame.event.Event
+        """
+        if self.waiting and self.event_type is not None and event.type == self.event_type:
+            self.change(self.next_state)
+
+    def update(self, dt):
+        """
+        Count down the pending transition, finishing it when its time is up
+
+        :param dt: float, seconds
+        """
+        if not self.waiting or self.remaining is None:
+            return
+        self.remaining -= dt
+        if self.remaining <= 0:
+            self.change(self.next_state)
@@ -0,0 +1,154 @@
+import pygame
+
+from backend.systems.profiling import profiler
+
+
+class SpatialHash(object):
+    """
+    Uniform grid broadphase
+
+    Every sprite is stored in each cell its rect overlaps, so a rect query only
+    has to look at the handful of sprites registered in the cells it covers
+    instead of the whole group.
+    """
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.bounds = {}
+
+    def cell_range(self, rect):
+        """
+        Return the (left, top, right, bottom) cell coordinates covered by a rectangle
+
+        :param rect: pygame.Rect
+        :return: tuple
+        """
+        size = self.cell_size
+        left, top = rect.left // size, rect.top // size
+        return left, top, max(left, (rect.right - 1) // size), max(top, (rect.bottom - 1) // size)
+
+    def insert(self, sprite):
+        bounds = self.cell_range(sprite.rect)
+        self.bounds[sprite] = bounds
+        self._link(sprite, bounds)
+
+    def remove(self, sprite):
+        bounds = self.bounds.pop(sprite, None)
+        if bounds:
+            self._unlink(sprite, bounds)
+
+    def update(self, sprite):
+        """
+        Move a sprite to the cells covered by its current rect, doing nothing if they haven't changed
+
+        :param sprite: pygame.sprite.Sprite
+        """
+        old_bounds = self.bounds.get(sprite)
+        if old_bounds is None:
+            return
+        bounds = self.cell_range(sprite.rect)
+        if bounds != old_bounds:
+            self._unlink(sprite, old_bounds)
+            self._link(sprite, bounds)
+            self.bounds[sprite] = bounds
+
+    def query(self, rect):
+        """
+        Return every sprite registered in a cell touched by the rectangle, in insertion order per cell
+
+        Results are only candidates, their rects still need to be tested against the query.
+
+        :param rect: pygame.Rect
+        :return: dict
+        """
+        left, top, right, bottom = self.cell_range(rect)
+        found = {}
+        for x in range(left, right + 1):
+            for y in range(top, bottom + 1):
+                bucket = self.cells.get((x, y))
+                if bucket:
+                    found.update(bucket)
+        return found
+
+    def clear(self):
+        self.cells.clear()
+        self.bounds.clear()
+
+    def _link(self, sprite, bounds):
+        left, top, right, bottom = bounds
+        for x in range(left, right + 1):
+            for y in range(top, bottom + 1):
+                self.cells.setdefault((x, y), {})[sprite] = None
+
+    def _unlink(self, sprite, bounds):
+        left, top, right, bottom = bounds
+        for x in range(left, right + 1):
+            for y in range(top, bottom + 1):
+                bucket = self.cells[(x, y)]
+                del bucket[sprite]
+                if not bucket:
+                    del self.cells[(x, y)]
+
+
+class SpatialGroup(pygame.sprite.Group):
+    """
+    Sprite group that keeps a spatial hash of its members
+
+    Sprites register on add and unregister on remove. Sprites that move call
+    sprite_moved (through StaticSprite.notify_moved) to keep the index current.
+    """
+    def __init__(self, *sprites, cell_size=64):
+        self.index = SpatialHash(cell_size)
+        self.order = {}  # sprite -> when it was added, the order the group iterates and draws in
+        self.added = 0
+        super(SpatialGroup, self).__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        super(SpatialGroup, self).add_internal(sprite, layer)
+        self.index.insert(sprite)
+        self.order[sprite] = self.added
+        self.added += 1
+
+    def remove_internal(self, sprite):
+        super(SpatialGroup, self).remove_internal(sprite)
+        self.index.remove(sprite)
+        del self.order[sprite]
+
+    def sprite_moved(self, sprite):
+        self.index.update(sprite)
+
+    def query(self, rect, ordered=False):
+        """
+        Return the members whose rects collide with the rectangle, in the group's own order if ordered is set
+
+        :param rect: pygame.Rect
+        :param ordered: bool
+        :return: list
+        """
+        found = [sprite for sprite in self.index.query(rect) if rect.colliderect(sprite.rect)]
+        if ordered:
+            found.sort(key=self.order.__getitem__)
+        return found
+
+
+def candidates(sprite, group, rect=None):
+    """
+    Return the sprites in group whose rects collide with rect (the sprite's own rect by default), excluding the sprite
+
+    Uses the group's spatial index when it has one and falls back to testing every member otherwise.
+
+    :param sprite: pygame.sprite.Sprite
+    :param group: pygame.sprite.Group
+    :param rect: pygame.Rect
+    :return: list
+    """
+    profiler.count("broadphase queries")
+    rect = sprite.rect if rect is None else rect
+    if hasattr(group, "query"):
+        collisions = group.query(rect)
+    else:
+        collisions = [other for other in group if rect.colliderect(other.rect)]
+
+    if sprite in collisions:
+        collisions.remove(sprite)
+    return collisions
@@ -1,17 +1,83 @@
 import pygame
 
+from backend.systems.assets import assets
+
+
+class SpriteAtlas(object):
+    """
+    A spritesheet scaled once and cut into named regions
+
+    Region images are subsurfaces of the scaled sheet, ready to blit without
+    scaling them again, and their masks are shared through the asset registry.
+    """
+    def __init__(self, sheet, scale, source=None):
+        self.sheet = sheet
+        self.scale = scale
+        self.source = source  # filename of the original sheet
+        self.regions = {}  # name -> unscaled rect on the original sheet
+        self.images = {}  # name -> scaled subsurface
+
+    def add(self, name, rect):
+        """
+        Name a region of the original sheet
+
+        :param name: str
+        :param rect: pygame.Rect
+        """
+        rect = pygame.Rect(rect)
+        self.regions[name] = rect
+        self.images[name] = self.sheet.subsurface([int(x * self.scale) for x in rect])
+
+    def image(self, name):
+        return self.images[name]
+
+    def mask(self, name):
+        return assets.mask(self.images[name])
+
+    def key(self, name):
+        """
+        Return a small key identifying a region's image, for caching things built from it
+
+        :param name: str
+        :return: tuple
+        """
+        return self.source, tuple(self.regions[name]), self.scale
+
 
 class SpriteSheet(object):
     """
     Class to load images from a spritesheet
     """
-    def __init__(self, filename):
+    atlases = {}  # (filename, scale) -> SpriteAtlas, shared by every sheet of the same file
+
+    def __init__(self, filename, cache_dir=None):
+        self.filename = filename
+        self.cache_dir = cache_dir  # where scaled atlases are saved between runs, if anywhere
         try:
-            # load sheet as image
-            self.sheet = pygame.image.load(filename).convert_alpha()
+            # load sheet as image, shared with every other sheet using the same file
+            self.sheet = assets.image(filename)
         except pygame.error as e:
             raise SystemExit(e, "Could not load spritesheet:" + filename)
 
+    def atlas(self, scale, regions=None):
+        """
+        Return the sheet scaled once by a factor, with regions added by name
+
+        :param scale: float
+        :param regions: dict(str, pygame.Rect)
+        :return: SpriteAtlas
+        """
+        key = self.filename, scale
+        if key not in self.atlases:
+            self.atlases[key] = SpriteAtlas(assets.image(self.filename, scale, self.cache_dir), scale,
+                                             self.filename)
+
+        atlas = self.atlases[key]
+        for name, rect in (regions or {}).items():
+            if name not in atlas.regions:
+                atlas.add(name, rect)
+        return atlas
+
     def image_at(self, rect):
         """
         Return the image at the target location selected by a rectangle.
@@ -30,6 +96,20 @@ class SpriteSheet(object):
         """
         return [self.image_at(rect) for rect in rects]
 
+    def strip(self, start_rect, image_count, scale=1.0):
+        """
+        Returns the images of load_strip scaled, as regions of the shared atlas
+
+        :param start_rect: pygame.Rect
+        :param image_count: int
+        :param scale: float
+        :return: tuple
+        """
+        rects = [pygame.Rect(start_rect[0] + start_rect[2] * x, start_rect[1], start_rect[2], start_rect[3])
+                 for x in range(image_count)]
+        atlas = self.atlas(scale, {tuple(rect): rect for rect in rects})
+        return tuple(atlas.image(tuple(rect)) for rect in rects)
+
     def load_strip(self, start_rect, image_count):
         """
         Returns a specified number of images after a defined selector as a list
@@ -42,40 +122,135 @@ class SpriteSheet(object):
                                for x in range(image_count)])
 
 
+class AnimationClip(object):
+    """
+    An immutable sequence of frames and the time each one is shown for
+
+    Clips hold no playback state, so any number of SpriteSheetAnimators can
+    play the same clip at once. Clips cut from a spritesheet are cached, and
+    their frames are regions of the sheet's shared atlas.
+    """
+    clips = {}  # (filename, rect, count, scale, frame_time) -> clip
+
+    def __init__(self, frames, frame_time):
+        self.frames = tuple(frames)
+        self.frame_time = frame_time
+
+    @classmethod
+    def from_sheet(cls, filename, rect, count, frame_time, scale=1.0):
+        """
+        Return the clip of count frames laid out left to right on a spritesheet, starting at rect
+
+        :param filename: str
+        :param rect: pygame.Rect
+        :param count: int
+        :param frame_time: float, seconds
+        :param scale: float
+        :return: AnimationClip
+        """
+        key = filename, tuple(rect), count, scale, frame_time
+        if key not in cls.clips:
+            cls.clips[key] = cls(SpriteSheet(filename).strip(rect, count, scale), frame_time)
+        return cls.clips[key]
+
+    @property
+    def duration(self):
+        return len(self.frames) * self.frame_time
+
+    def index_at(self, time, loop=False):
+        """
+        Return the index of the frame shown time seconds into the clip, or None once a clip that doesn't loop has ended
+
+        Empty and zero-length clips have always ended.
+
+        :param time: float
+        :param loop: bool
+        :return: int
+        """
+        if not self.duration:
+            return None
+        i = int(time / self.frame_time + 1e-9)  # tolerate float error from summing timesteps
+        if i < len(self.frames):
+            return i
+        return i % len(self.frames) if loop else None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __add__(self, other):
+        # one frame time covers the whole clip, joined clips have to agree on it
+        if other.frame_time != self.frame_time:
+            raise ValueError(f"Can't join clips with frame times {self.frame_time} and {other.frame_time}")
+        return AnimationClip(self.frames + other.frames, self.frame_time)
+
+
 class SpriteSheetAnimator(object):
-    def __init__(self, filename, rect, count, loop=False, frames=1):
-        self.filename = filename
-        self.ss = SpriteSheet(self.filename)
+    """
+    Plays an AnimationClip, keeping only the playhead per instance
 
-        self.images = self.ss.load_strip(rect, count)
+    Advances by elapsed time through update(dt). As an iterator, each step
+    advances by one fixed timestep, so frames is the number of updates each
+    image is shown for.
+    """
+    def __init__(self, filename, rect, count, loop=False, frames=1, scale=1.0, clip=None, timestep=1 / 60):
+        """
+        :param frames: int, timesteps each image is shown for
+        :param clip: AnimationClip, played instead of loading one from the sheet
+        :param timestep: float, seconds, the game's fixed step
+        """
+        self.timestep = timestep
+        if clip is None:
+            clip = AnimationClip.from_sheet(filename, rect, count, frames * timestep, scale)
+        self.clip = clip
         self.loop = loop
+        self.time = 0.0
 
-        self.max_frames = frames
-        self.cur_frame = self.max_frames
+    @property
+    def images(self):
+        return self.clip.frames
 
-        self.i = 0
+    @property
+    def finished(self):
+        return self.clip.index_at(self.time, self.loop) is None
 
-    def iter(self):
-        self.i = 0
-        self.cur_frame = self.max_frames
-        return self
+    @property
+    def image(self):
+        """
+        The frame at the playhead, holding the last frame once a clip that doesn't loop has ended
+
+        :return: pygame.Surface, None for an empty clip
+        """
+        if not self.clip.frames:
+            return None
+        i = self.clip.index_at(self.time, self.loop)
+        return self.clip.frames[-1 if i is None else i]
 
-    def next(self):
-        if self.i >= len(self.images):
-            if not self.loop:
-                raise StopIteration
-            else:
-                self.i = 0
+    def update(self, dt=None):
+        """
+        Move the playhead forward and return the frame now showing
 
-        image = self.images[self.i]
-        self.cur_frame -= 1
+        :param dt: float, seconds, one timestep if omitted
+        :return: pygame.Surface
+        """
+        self.time += self.timestep if dt is None else dt
+        if self.loop and self.clip.duration:
+            self.time %= self.clip.duration  # keep the playhead small so float error doesn't build up
+        return self.image
 
-        if self.cur_frame == 0:
-            self.i += 1
-            self.cur_frame = self.max_frames
-        return image
+    def rewind(self):
+        self.time = 0.0
 
-    def __add__(self, other):
-        self.images.extend(other.images)
+    def __iter__(self):
+        self.rewind()
         return self
 
+    def __next__(self):
+        if self.finished:
+            raise StopIteration
+        image = self.image
+        self.update()
+        return image
+
+    def __add__(self, other):
+        # a new animator playing both clips back to back, the clips' frames are left untouched
+        return SpriteSheetAnimator(None, None, None, self.loop, clip=self.clip + other.clip, timestep=self.timestep)
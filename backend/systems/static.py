@@ -0,0 +1,71 @@
+import pygame
+
+from backend.systems.profiling import profiler
+
+
+class StaticCollider(pygame.sprite.Sprite):
+    """
+    A single collider standing in for every sprite of a StaticLayer
+    """
+    def __init__(self):
+        super(StaticCollider, self).__init__()
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.mask = pygame.Mask((0, 0))
+
+
+class StaticLayer(object):
+    """
+    Sprites that never move, baked into one background surface and one collider
+
+    Drawing the layer is a single blit of the cached background and collision
+    tests against it are a single mask test, however many sprites were added.
+    The bake is redone only when the sprites or the surface size change.
+    """
+    def __init__(self, background_color):
+        self.background_color = background_color
+        self.sprites = []
+        self.collider = StaticCollider()
+
+        self.surface = None
+        self.size = None
+
+    def add(self, *sprites):
+        self.sprites.extend(sprites)
+        self.size = None  # rebake on the next call to bake
+
+    def empty(self):
+        self.sprites = []
+        self.size = None
+
+    def bake(self, size):
+        """
+        Composite the sprites into a background of the given size and merge their masks
+
+        Does nothing if already baked at this size.
+
+        :param size: tuple
+        :return: bool
+        """
+        if size == self.size:
+            return False
+        self.size = size
+
+        profiler.count("surfaces")
+        self.surface = pygame.Surface(size).convert()
+        self.surface.fill(self.background_color)
+        self.surface.blits([(sprite.image, sprite.rect) for sprite in self.sprites], False)
+
+        if self.sprites:
+            bounds = self.sprites[0].rect.unionall([sprite.rect for sprite in self.sprites])
+        else:
+            bounds = pygame.Rect(0, 0, 0, 0)
+        mask = pygame.Mask(bounds.size)
+        for sprite in self.sprites:
+            mask.draw(sprite.mask, (sprite.rect.x - bounds.x, sprite.rect.y - bounds.y))
+
+        self.collider.rect = bounds
+        self.collider.mask = mask
+        for group in self.collider.groups():
+            if hasattr(group, "sprite_moved"):
+                group.sprite_moved(self.collider)
+        return True
@@ -0,0 +1,105 @@
+from collections import OrderedDict
+
+import pygame
+
+from backend.systems.profiling import profiler
+
+
+class CachedFont(pygame.font.Font):
+    """
+    Font that only rasterizes strings it hasn't rendered recently
+
+    Rendered surfaces are kept in a small LRU keyed by everything that affects
+    the output, so callers re-rendering an unchanged string every frame get
+    the previous surface back. Returned surfaces are shared and must not be
+    drawn on.
+
+    Also keeps a glyph atlas so strings drawn from a small alphabet, like
+    digits, can be assembled by blitting cached glyphs instead of rasterizing.
+    """
+    def __init__(self, filename, size, cache_size=32):
+        super(CachedFont, self).__init__(filename, size)
+        self.cache_size = cache_size
+        self.renders = OrderedDict()
+        self.glyphs = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.glyph_hits = 0
+        self.glyph_misses = 0
+
+    def render(self, text, antialias, color, background=None):
+        key = text, antialias, tuple(color), background and tuple(background)
+        surface = self.renders.get(key)
+        if surface:
+            self.hits += 1
+            self.renders.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        profiler.count("surfaces")
+        surface = super(CachedFont, self).render(text, antialias, color, background)
+        self.remember(key, surface)
+        return surface
+
+    def glyph(self, char, antialias, color):
+        """
+        Return the cached surface of a single character
+
+        :param char: str
+        :param antialias: bool
+        :param color: tuple
+        :return: pygame.Surface
+        """
+        key = char, antialias, tuple(color)
+        surface = self.glyphs.get(key)
+        if surface:
+            self.glyph_hits += 1
+            return surface
+
+        self.glyph_misses += 1
+        profiler.count("surfaces")
+        surface = self.glyphs[key] = super(CachedFont, self).render(char, antialias, color)
+        return surface
+
+    def preload_glyphs(self, chars, antialias, color):
+        # rasterize an alphabet up front, so strings drawn from it later never miss the atlas
+        for char in chars:
+            self.glyph(char, antialias, color)
+
+    def render_glyphs(self, text, antialias, color):
+        """
+        Render a string by blitting glyphs from the atlas, ignoring kerning
+
+        Works best for monospaced alphabets such as digits. The result goes
+        through the same cache as render.
+
+        :param text: str
+        :param antialias: bool
+        :param color: tuple
+        :return: pygame.Surface
+        """
+        key = text, antialias, tuple(color), "glyphs"
+        surface = self.renders.get(key)
+        if surface:
+            self.hits += 1
+            self.renders.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        profiler.count("surfaces")
+        glyphs = [self.glyph(char, antialias, color) for char in text]
+        surface = pygame.Surface((sum(glyph.get_width() for glyph in glyphs), self.get_height()), pygame.SRCALPHA)
+
+        x = 0
+        for glyph in glyphs:
+            surface.blit(glyph, (x, 0))
+            x += glyph.get_width()
+
+        self.remember(key, surface)
+        return surface
+
+    def remember(self, key, surface):
+        self.renders[key] = surface
+        if len(self.renders) > self.cache_size:
+            self.renders.popitem(last=False)
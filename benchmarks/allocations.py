@@ -0,0 +1,90 @@
+"""
+Count surfaces allocated per frame while a box is held and rotated
+
+Allocations are counted where they happen: the profiler's "surfaces" counter,
+bumped by every cache miss that builds a surface (rotations and their masks,
+text, overlays, the static background), and the rotation and text caches' own
+miss counters. Exits with an error if steady state frames allocate any
+surfaces. Run from the repository root:
+
+    python benchmarks/allocations.py --frames 240
+"""
+import argparse
+import random
+import sys
+
+import common  # sets up headless SDL and the repository root, before pygame is imported
+
+import pygame
+
+import backend
+import main
+
+
+def hold_and_rotate(game, box, frames):
+    """
+    Return the number of surfaces the profiler counted over the frames, and how many times the HUD text changed
+
+    The countdown shows a new string every second, which has to be rendered once.
+
+    :return: tuple(int, int)
+    """
+    allocated = changed = 0
+    for frame in range(frames):
+        displays = game.timer_display, game.score_display
+        if frame % 4 == 0:
+            game.boxes.rotate_selected(5)
+        box.move_to_target((game.width // 2 + frame % 50, game.height // 3), game.colliders)
+        game.simulate(1)
+        game.draw()
+        game.present()
+        record = game.profiler.frames[-1]
+        allocated += record["counts"].get("surfaces", 0)
+        changed += sum(old is not new for old, new in zip(displays, (game.timer_display, game.score_display)))
+    return allocated, changed
+
+
+def text_misses(game):
+    return sum(font.misses + font.glyph_misses for font in (game.timer, game.score_counter))
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=240)
+    parser.add_argument("--rotation-cache-bytes", type=int, default=None,
+                        help="shrink the rotation cache, e.g. 0 to check that misses are caught")
+    args = parser.parse_args()
+
+    rotations = backend.systems.rotation.rotation_cache
+    if args.rotation_cache_bytes is not None:
+        rotations.max_bytes = args.rotation_cache_bytes
+
+    random.seed(0)
+    game = main.Game()
+    game.profiler.enable()
+    game.start_game()
+    game.simulate(120)
+
+    box = game.boxes.sprites()[0]
+    game.boxes.box_selected = box
+    box.toggle()
+
+    # a full turn of 5 degree steps fills the rotation and overlay caches
+    hold_and_rotate(game, box, 4 * 72)
+
+    rotation_misses, fonts_missed = rotations.misses, text_misses(game)
+    allocated, text_changes = hold_and_rotate(game, box, args.frames)
+    rotation_misses = rotations.misses - rotation_misses
+    fonts_missed = text_misses(game) - fonts_missed
+
+    print(f"surfaces allocated over {args.frames} frames: {allocated} "
+          f"({rotation_misses} rotation cache misses, {fonts_missed} text cache misses "
+          f"for {text_changes} HUD text changes)")
+    pygame.quit()
+    # anything beyond one render per new HUD string is a steady state allocation
+    if allocated > text_changes or rotation_misses or fonts_missed > text_changes:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_benchmark()
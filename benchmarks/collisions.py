@@ -0,0 +1,91 @@
+"""
+Per-frame collision cost versus box count, with and without the spatial index
+
+Run from the repository root:
+
+    python benchmarks/collisions.py --counts 50 100 200 400 --frames 60
+"""
+import argparse
+import random
+import time
+
+import common  # sets up headless SDL and the repository root, before pygame is imported
+
+import pygame
+
+import backend
+import extend.entities
+
+SCALE = 2
+TILE = 32 * SCALE
+
+
+def build_scene(count, colliders):
+    """
+    Lay count boxes out on a grid above a row of ground tiles so they fall and stack
+
+    :param count: int
+    :param colliders: pygame.sprite.Group
+    :return: list
+    """
+    sheet = backend.systems.spritesheets.SpriteSheet("assets/sprites/boxes.png")
+    environment = backend.systems.spritesheets.SpriteSheet("assets/sprites/environment.png")
+    box_image = sheet.image_at(pygame.Rect(32, 0, 16, 16))
+
+    columns = max(1, int(count ** 0.5))
+    rows = -(-count // columns)
+    width, height = columns * TILE, (rows + 2) * TILE
+
+    for x in range(columns):
+        extend.entities.Ground(x * TILE, height - TILE, environment.image_at(pygame.Rect(32 * 8, 0, 32, 32)),
+                               SCALE).add(colliders)
+
+    boxes = []
+    for i in range(count):
+        row, column = divmod(i, columns)
+        box = extend.entities.Box(column * TILE + random.randint(0, TILE // 2), row * TILE, box_image, "small crate",
+                                  SCALE)
+        box.add(colliders)
+        boxes.append(box)
+    return boxes
+
+
+def run(count, frames, indexed):
+    random.seed(count)
+    if indexed:
+        colliders = backend.systems.spatial.SpatialGroup(cell_size=TILE)
+    else:
+        colliders = pygame.sprite.Group()
+    boxes = build_scene(count, colliders)
+
+    times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        for box in boxes:
+            box.update(colliders, None, None)
+        times.append(time.perf_counter() - start)
+
+    times.sort()
+    return times[len(times) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[50, 100, 200, 400])
+    parser.add_argument("--frames", type=int, default=60)
+    args = parser.parse_args()
+
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+
+    print(f"{'boxes':>6} {'group (ms)':>12} {'indexed (ms)':>13} {'speedup':>8}")
+    for count in args.counts:
+        flat = run(count, args.frames, False)
+        indexed = run(count, args.frames, True)
+        print(f"{count:>6} {flat:>12.2f} {indexed:>13.2f} {flat / indexed:>7.1f}x")
+
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
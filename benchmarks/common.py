@@ -0,0 +1,123 @@
+"""
+Helpers shared by the benchmarks
+
+Importing this module points SDL at its dummy video and audio drivers, puts
+the repository root on sys.path and makes it the working directory, so it
+has to be imported before pygame or any of the game's modules.
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+
+PHASES = "update", "collisions", "scoring", "draw", "flip", "frame"
+PHASE_PERCENTILES = 50, 90, 99, 100  # frame times, where the tail matters
+SPREAD_PERCENTILES = 10, 25, 50, 75, 90, 100  # results across games, where the whole spread matters
+
+
+def commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentiles(samples, points, scale=1):
+    """
+    Return the given percentiles of the samples, keyed "p50" and so on
+
+    :param samples: list
+    :param points: tuple(int)
+    :param scale: number each value is multiplied by, 1000 to report seconds as milliseconds
+    :return: dict
+    """
+    samples = sorted(samples)
+    return {f"p{p}": round(samples[min(len(samples) - 1, len(samples) * p // 100)] * scale, 4) for p in points}
+
+
+def add_phases(samples, record):
+    """
+    Split one profiler frame record into PHASES and append each to its list of samples
+
+    :param samples: dict(str, list)
+    :param record: dict, from profiler.frames
+    """
+    timings = record["timings"]
+    samples["update"].append(timings.get("update", 0.0))
+    samples["collisions"].append(timings.get("collisions", 0.0) + timings.get("falling", 0.0))
+    samples["scoring"].append(timings.get("scoring", 0.0))
+    samples["draw"].append(timings.get("draw", 0.0))
+    samples["flip"].append(timings.get("flip", 0.0))
+    samples["frame"].append(record["frame_time"])
+
+
+def trailer_rect(game):
+    # the trailer's opaque pixels, on screen
+    rects = game.truck.trailer_mask.get_bounding_rects()
+    return rects[0].unionall(rects).move(game.truck.rect.topleft)
+
+
+def door_rect(game, trailer):
+    # the column behind the trailer's open back that carried boxes are lowered through
+    return pygame.Rect(trailer.right, 0, game.SPRITE_SCALE * 64, trailer.bottom)
+
+
+def next_box(boxes, door, rng, choices=5):
+    """
+    Pick the box to carry into the trailer next
+
+    Boxes in the way of the door go first, highest first, otherwise it's one
+    of the highest boxes, since deeper ones get stuck under the pile.
+
+    :param boxes: list, boxes outside the truck, highest first
+    :param door: pygame.Rect, from door_rect
+    :param rng: random.Random
+    :param choices: int, how many of the highest boxes to choose from
+    :return: extend.entities.Box, None if there are no boxes
+    """
+    if not boxes:
+        return None
+    blocking = [box for box in boxes if box.rect.colliderect(door)]
+    return blocking[0] if blocking else rng.choice(boxes[:choices])
+
+
+def grab(game, box):
+    """
+    Click on an opaque pixel of a box, clicks on transparent ones go through to what's behind it
+
+    :param game: main.Game
+    :param box: extend.entities.Box
+    :return: extend.entities.Box, the box now held, None if the click missed
+    """
+    x, y = box.mask.outline()[0]
+    game.mouse_pos = box.rect.x + x, box.rect.y + y
+    game.boxes.toggle(game.mouse_pos, game.all_sprites)
+    return game.boxes.box_selected
+
+
+def route(game, box, trailer, y):
+    """
+    Return the points a held box's centre follows into the trailer
+
+    The trailer has a roof, so the box is lifted clear of the pile, carried
+    over to the back of the truck, lowered to y in line with the door and
+    pushed in towards the cab, each time just clear of whatever it passes.
+
+    :param game: main.Game
+    :param box: extend.entities.Box
+    :param trailer: pygame.Rect, from trailer_rect
+    :param y: int, height the box is pushed in at
+    :return: list
+    """
+    width, height = box.rect.size
+    clear = min([game.truck.rect.top] + [other.rect.top for other in game.boxes if other is not box]) - height // 2 - 1
+    door = trailer.right + width // 2 + 1
+    return [box.rect.center, (box.rect.centerx, clear), (door, clear), (door, y), (trailer.left + width // 2, y)]
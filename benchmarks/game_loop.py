@@ -0,0 +1,122 @@
+"""
+Headless frame-time benchmark of the full game loop
+
+Builds Game on SDL's dummy video and audio drivers, populates it with each
+requested number of boxes and plays a scripted session: pick a box, drag it
+into the trailer's open back while rotating it, drop it, repeat. Every frame is split into
+phases and the percentiles of each are written as JSON so runs can be
+compared between commits. Run from the repository root:
+
+    python benchmarks/game_loop.py --boxes 50 500 5000 --frames 600 --output bench.json
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+
+from common import (PHASE_PERCENTILES, PHASES, add_phases, commit, door_rect, grab, next_box, percentiles, route,
+                    trailer_rect)
+
+import pygame
+
+import backend
+import main
+
+
+def script(game, frame, state):
+    """
+    Scripted player: every 90 frames grab a box, carry it into the trailer's open back rotating as it goes, drop it
+
+    The trailer has a roof, so the box is lifted over the pile, carried to
+    the back of the truck, lowered in line with the door and pushed in.
+    Boxes piled in front of the door are cleared first.
+
+    :param game: main.Game
+    :param frame: int
+    :param state: dict
+    """
+    step = frame % 90
+    if step == 0:
+        trailer = trailer_rect(game)
+        boxes = sorted((box for box in game.boxes if box not in game.boxes.in_truck), key=lambda box: box.rect.top)
+        box = next_box(boxes, door_rect(game, trailer), state["rng"])
+        if box is None:
+            return
+        grab(game, box)
+        state["waypoints"] = route(game, box, trailer, trailer.bottom - box.rect.height)
+    elif step <= 60 and game.boxes.box_selected:
+        leg, t = divmod(step - 1, 15)
+        (x1, y1), (x2, y2) = state["waypoints"][leg:leg + 2]
+        t = (t + 1) / 15
+        game.mouse_pos = int(x1 + (x2 - x1) * t), int(y1 + (y2 - y1) * t)
+        if step % 10 == 0 and leg < 2:
+            game.boxes.rotate_selected(5)
+    elif step == 61 and game.boxes.box_selected:
+        game.boxes.toggle(game.mouse_pos, game.all_sprites)
+
+
+def run(boxes, args):
+    random.seed(args.seed)
+    game = main.Game((args.width, args.height), args.scale, fullscreen=False)
+    game.num_boxes = boxes
+    game.dirty_rendering = args.dirty
+    game.start_game()
+    game.simulate(args.warmup)
+
+    profiler = backend.systems.profiling.profiler
+    profiler.enable()
+
+    samples = {phase: [] for phase in PHASES}
+    counts = {}
+    state = {"rng": random.Random(args.seed)}
+    for frame in range(args.frames):
+        script(game, frame, state)
+        game.update(game.timestep)
+        game.draw()
+        game.present()
+
+        record = profiler.frames[-1]
+        add_phases(samples, record)
+        for name, value in record["counts"].items():
+            counts[name] = counts.get(name, 0) + value
+    profiler.enable(False)
+
+    return {"boxes": boxes, "score": game.score_counter.score,
+            "phases": {phase: percentiles(values, PHASE_PERCENTILES, 1000) for phase, values in samples.items()},
+            "counts_per_frame": {name: total / args.frames for name, total in counts.items()}}
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--boxes", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--warmup", type=int, default=120, help="simulation steps to let boxes settle first")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--scale", type=int, default=None, help="SPRITE_SCALE, derived from the width by default")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dirty", action="store_true", help="use dirty rectangle rendering")
+    parser.add_argument("--output", default=None, help="JSON file to write, printed to stdout if omitted")
+    args = parser.parse_args()
+
+    results = []
+    for boxes in args.boxes:
+        result = run(boxes, args)
+        results.append(result)
+        frame = result["phases"]["frame"]
+        print(f"{boxes:>6} boxes: frame p50 {frame['p50']:.2f} ms, p99 {frame['p99']:.2f} ms", file=sys.stderr)
+
+    report = {"commit": commit(), "python": platform.python_version(), "pygame": pygame.version.ver,
+              "config": {key: value for key, value in vars(args).items() if key not in ("boxes", "output")},
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main_benchmark()
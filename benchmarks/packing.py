@@ -0,0 +1,246 @@
+"""
+Headless truck packing solver, for tuning difficulty and the grade thresholds
+
+For each seed, draws boxes exactly as Game.start_game would, then searches for
+the best packing of them into the trailer. Each worker process runs
+bottom-left fill over the trailer bitmap, in the base sprite resolution, with
+every box tried at every angle_step degrees of rotation. The workers try
+different box orders until the time budget runs out: by area, by value, by
+value per pixel, then random orders. The best packing of each draw is scored
+like ScoreBreakdown, and the spread of the best efficiencies across draws is
+reported so the thresholds in get_grade can be set from data. Run from the
+repository root:
+
+    python benchmarks/packing.py --seeds 0 1 2 3 --budget 20 --output packing.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from common import SPREAD_PERCENTILES, percentiles
+
+import pygame
+
+import extend.entities
+import main
+
+ORDERS = "area", "value", "density"
+
+
+def rotations(image, angle_step):
+    """
+    Return each distinct (angle, mask) of an image rotated in angle_step degree steps, cropped to the set bits
+
+    :param image: pygame.Surface
+    :param angle_step: int
+    :return: list
+    """
+    found = {}
+    for angle in range(0, 360, angle_step):
+        rotated = pygame.transform.rotate(image, angle)
+        rotated = rotated.subsurface(rotated.get_bounding_rect())
+        mask = pygame.mask.from_surface(rotated)
+        key = mask.get_size(), pygame.image.tobytes(mask.to_surface(), "RGB")
+        if key not in found:
+            found[key] = angle, mask
+    return list(found.values())
+
+
+def bottom_left(free):
+    """
+    Return the lowest, then leftmost, set bit of a mask, or None if it's empty
+
+    :param free: pygame.mask.Mask
+    :return: tuple
+    """
+    rects = free.get_bounding_rects()
+    if not rects:
+        return None
+    y = max(rect.bottom for rect in rects) - 1
+    for x in range(min(rect.left for rect in rects if rect.bottom - 1 == y), free.get_size()[0]):
+        if free.get_at((x, y)):
+            return x, y
+    return None
+
+
+def pack(order, boxes, shapes, trailer, deadline):
+    """
+    Bottom-left fill: put each box in turn where its top is lowest over all its rotations, skipping any that don't fit
+
+    :param order: list, indexes into boxes
+    :param boxes: list, shape of each box
+    :param shapes: dict, shape -> rotations
+    :param trailer: pygame.mask.Mask
+    :param deadline: float, perf_counter time to stop at
+    :return: list of (box index, angle, x, y)
+    """
+    width, height = trailer.get_size()
+    blocked = trailer.copy()
+    blocked.invert()
+
+    placements = []
+    full = set()  # shapes that fit nowhere, space only ever runs out so they never will
+    for index in order:
+        if time.perf_counter() > deadline:
+            break
+        if boxes[index] in full:
+            continue
+        best = None
+        for angle, mask in shapes[boxes[index]]:
+            w, h = mask.get_size()
+            if w > width or h > height:
+                continue
+            # bit (x, y) is set when the mask placed with its top left at (x, y) overlaps something
+            free = pygame.mask.Mask((width - w + 1, height - h + 1))
+            blocked.convolve(mask, free, (1 - w, 1 - h))
+            free.invert()
+            position = bottom_left(free)
+            # keep the stack low: the rotation whose top ends up lowest wins, then the one furthest left
+            if position and (best is None or (position[1], -position[0]) > best[0]):
+                best = (position[1], -position[0]), angle, mask, position
+        if best:
+            _, angle, mask, position = best
+            blocked.draw(mask, position)
+            placements.append((index, angle) + position)
+        else:
+            full.add(boxes[index])
+    return placements
+
+
+def evaluate(placements, boxes, shapes, trailer, values):
+    masks = {(shape, angle): mask for shape in shapes for angle, mask in shapes[shape]}
+    area = sum(masks[boxes[index], angle].count() for index, angle, _, _ in placements)
+    efficiency = area / trailer.count()
+    base_score = sum(values[boxes[index]] for index, _, _, _ in placements)
+    return efficiency, base_score, base_score * efficiency
+
+
+def order_for(strategy, boxes, shapes, values, rng):
+    areas = {shape: shapes[shape][0][1].count() for shape in shapes}
+    indexes = list(range(len(boxes)))
+    if strategy == "area":
+        return sorted(indexes, key=lambda i: -areas[boxes[i]])
+    if strategy == "value":
+        return sorted(indexes, key=lambda i: (-values[boxes[i]], -areas[boxes[i]]))
+    if strategy == "density":
+        return sorted(indexes, key=lambda i: -values[boxes[i]] / areas[boxes[i]])
+    rng.shuffle(indexes)
+    return indexes
+
+
+def search(job):
+    """
+    Worker: pack with one ordering after another until the deadline, at least once, returning the best packing found
+
+    :param job: dict
+    :return: dict
+    """
+    images = {shape: pygame.image.frombytes(data, size, "RGBA") for shape, (data, size) in job["images"].items()}
+    shapes = {shape: rotations(image, job["angle_step"]) for shape, image in images.items()}
+    truck = pygame.image.frombytes(job["truck"][0], job["truck"][1], "RGBA")
+    trailer_mask = extend.entities.Truck.build_trailer_mask(truck)
+    crop = trailer_mask.get_bounding_rects()[0].unionall(trailer_mask.get_bounding_rects())
+    trailer = pygame.mask.Mask(crop.size)
+    trailer.draw(trailer_mask, (-crop.x, -crop.y))  # only the trailer's bounding box is searched
+
+    rng = random.Random(job["seed"])
+    deadline = time.perf_counter() + job["budget"]
+    best, attempts = None, 0
+    strategies = [job["strategy"]] if job["strategy"] else []
+    while best is None or time.perf_counter() < deadline:
+        strategy = strategies.pop(0) if strategies else "random"
+        placements = pack(order_for(strategy, job["boxes"], shapes, job["values"], rng),
+                          job["boxes"], shapes, trailer, deadline)
+        efficiency, base_score, total_score = evaluate(placements, job["boxes"], shapes, trailer, job["values"])
+        attempts += 1
+        key = efficiency if job["objective"] == "efficiency" else total_score
+        if best is None or key > best["key"]:
+            best = {"key": key, "strategy": strategy, "efficiency": efficiency, "base_score": base_score,
+                    "total_score": total_score,
+                    "placements": [{"shape": job["boxes"][index], "angle": angle, "x": x, "y": y}
+                                   for index, angle, x, y in placements]}
+    best["attempts"] = attempts
+    return best
+
+
+def draw_boxes(seed, args):
+    """
+    Return the game and the shapes Game.start_game draws for a seed
+
+    :param seed: int
+    :param args: argparse.Namespace
+    :return: tuple(main.Game, list)
+    """
+    random.seed(seed)
+    game = main.Game((args.width, args.height), args.scale, fullscreen=False)
+    game.num_boxes = args.boxes
+    game.start_game()
+    return game, [box.shape for box in game.boxes]
+
+
+def jobs_for(game, boxes, seed, args):
+    # everything a worker needs, as plain data: box and truck images at base resolution, the draw and the settings
+    controller = extend.entities.BoxController(game.box_sprites, game.screen, 1)
+    truck = game.environment.atlas(1, {"truck": game.environment_atlas.regions["truck"]}).image("truck")
+    job = {"images": {shape: (pygame.image.tobytes(image, "RGBA"), image.get_size())
+                      for shape, image in controller.images.items() if shape in boxes},
+           "truck": (pygame.image.tobytes(truck, "RGBA"), truck.get_size()),
+           "boxes": boxes, "values": game.score_counter.item_values, "angle_step": args.angle_step,
+           "budget": args.budget, "objective": args.objective}
+    # the fixed orderings go to the first workers, the rest start straight on random orders
+    return [dict(job, seed=seed * 1000 + worker, strategy=ORDERS[worker] if worker < len(ORDERS) else None)
+            for worker in range(args.workers)]
+
+
+def main_packing():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--boxes", type=int, default=50, help="boxes drawn per game, Game.num_boxes")
+    parser.add_argument("--budget", type=float, default=10.0, help="seconds of search per draw")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--angle-step", type=int, default=5, help="degrees between the rotations tried")
+    parser.add_argument("--objective", choices=("efficiency", "score"), default="efficiency")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--scale", type=int, default=None, help="SPRITE_SCALE, derived from the width by default")
+    parser.add_argument("--output", default=None, help="JSON file to write, printed to stdout if omitted")
+    args = parser.parse_args()
+    if args.budget <= 0:
+        parser.error("--budget must be more than 0 seconds, each worker needs time for at least one packing")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for seed in args.seeds:
+            game, boxes = draw_boxes(seed, args)
+            found = list(pool.map(search, jobs_for(game, boxes, seed, args)))
+            best = max(found, key=lambda result: result["key"])
+            best["attempts"] = sum(result["attempts"] for result in found)
+            del best["key"]
+            best["seed"] = seed
+            best["boxes"] = len(boxes)
+            best["grade"] = game.final_score.get_grade(best["efficiency"] * 100)
+            results.append(best)
+            print(f"seed {seed}: {len(best['placements'])}/{len(boxes)} boxes packed, "
+                  f"efficiency {best['efficiency']:.1%}, grade {best['grade']}, score {best['total_score']:.0f}",
+                  file=sys.stderr)
+
+    report = {"config": {key: value for key, value in vars(args).items() if key != "output"},
+              "efficiency_percentiles": percentiles([result["efficiency"] * 100 for result in results],
+                                                    SPREAD_PERCENTILES),
+              "total_score_percentiles": percentiles([result["total_score"] for result in results],
+                                                     SPREAD_PERCENTILES),
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main_packing()
@@ -0,0 +1,67 @@
+"""
+Frame draw cost of full redraws versus dirty rectangle rendering
+
+Run from the repository root:
+
+    python benchmarks/rendering.py --boxes 50 200 --frames 120
+"""
+import argparse
+import random
+import time
+
+import common  # sets up headless SDL and the repository root, before pygame is imported
+
+import main
+
+
+def run(game, frames, dirty):
+    """
+    Drag one box around a settled scene and time draw plus present
+
+    :param game: main.Game
+    :param frames: int
+    :param dirty: bool
+    :return: float
+    """
+    game.dirty_rendering = dirty
+    game.renderer.invalidate()
+
+    box = game.boxes.sprites()[0]
+    box.toggle()
+
+    times = []
+    for frame in range(frames):
+        box.move_to_target((game.width // 4 + frame % 100, game.height // 3), game.colliders)
+        game.simulate(1)
+
+        start = time.perf_counter()
+        game.draw()
+        game.present()
+        times.append(time.perf_counter() - start)
+
+    box.toggle()
+    times.sort()
+    return times[len(times) // 2] * 1000
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--boxes", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--frames", type=int, default=120)
+    args = parser.parse_args()
+
+    print(f"{'boxes':>6} {'full (ms)':>10} {'dirty (ms)':>11} {'speedup':>8}")
+    for count in args.boxes:
+        random.seed(count)
+        game = main.Game()
+        game.start_game()
+        game.boxes.populate(count - 50, game.colliders, game.all_sprites)
+        game.simulate(300)
+
+        full = run(game, args.frames, False)
+        dirty = run(game, args.frames, True)
+        print(f"{count:>6} {full:>10.2f} {dirty:>11.2f} {full / dirty:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main_benchmark()
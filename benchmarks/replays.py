@@ -0,0 +1,83 @@
+"""
+Replay recorded sessions headless, as a performance regression corpus
+
+Each file recorded with main.py --record is played back as fast as possible
+on SDL's dummy drivers with the profiler on. Every frame is split into phases,
+and each session reports their percentiles and whether it still ends exactly
+as recorded, so a change that alters gameplay shows up next to its timings.
+Run from the repository root:
+
+    python benchmarks/replays.py sessions/*.rec --output replays.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+from common import PHASE_PERCENTILES, PHASES, add_phases, commit, percentiles
+
+import pygame
+
+import backend
+import extend.entities
+import main
+
+
+def run(path):
+    replay = backend.systems.replay.Replay(path)
+    game = main.Game(replay.header["resolution"], replay.header["sprite_scale"], fullscreen=False, seed=replay.seed)
+    game.replay = replay
+
+    profiler = backend.systems.profiling.profiler
+    profiler.enable()
+
+    samples = {phase: [] for phase in PHASES}
+    start = time.perf_counter()
+    while game.running:
+        frame_number = profiler.frame_number
+        try:
+            game.frame()
+        except extend.entities.RestartGameException:
+            pass
+        if profiler.frame_number == frame_number:
+            continue  # restarted or finished before drawing, no frame was recorded
+
+        add_phases(samples, profiler.frames[-1])
+    seconds = time.perf_counter() - start
+    profiler.enable(False)
+    replay.close()
+
+    return {"file": path, "frames": replay.frames, "seconds": round(seconds, 3),
+            "reproduced": replay.matches(game.summary()),
+            "phases": {phase: percentiles(values, PHASE_PERCENTILES, 1000)
+                       for phase, values in samples.items() if values}}
+
+
+def main_replays():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="+", help="sessions recorded with main.py --record")
+    parser.add_argument("--output", default=None, help="JSON file to write, printed to stdout if omitted")
+    args = parser.parse_args()
+
+    results = []
+    for path in args.files:
+        result = run(path)
+        results.append(result)
+        frame = result["phases"].get("frame", {})
+        print(f"{path}: {result['frames']} frames in {result['seconds']:.2f}s, frame p50 {frame.get('p50', 0):.2f} ms, "
+              f"{'reproduced' if result['reproduced'] else 'DIVERGED'}", file=sys.stderr)
+
+    report = {"commit": commit(), "python": platform.python_version(), "pygame": pygame.version.ver,
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    pygame.quit()
+    sys.exit(0 if all(result["reproduced"] for result in results) else 1)
+
+
+if __name__ == "__main__":
+    main_replays()
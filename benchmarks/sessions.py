@@ -0,0 +1,158 @@
+"""
+Simulate whole games headless across a process pool, for balancing the scoring
+
+Each worker process builds one headless Game and plays session after session
+on it with Game.play, as fast as the simulation runs: no window, sound, drawing
+or frame cap. A bot stands in for the player, grabbing a random box outside the
+truck and pushing it into the trailer, once every --move-time seconds of game
+time. Session n is seeded with --seed + n, so every session is
+reproducible however the sessions are spread over the workers. Box values,
+box weights and the game length can be overridden to try out a balance
+change, and the distributions of the final scores are reported as JSON. Run
+from the repository root:
+
+    python benchmarks/sessions.py --sessions 1000 --game-time 90 --output sessions.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from common import SPREAD_PERCENTILES, commit, door_rect, grab, next_box, percentiles, route, trailer_rect
+
+import pygame
+
+import main
+
+# the game each worker process reuses for all of its sessions
+session_game = None
+settings = None
+
+
+class Mover(object):
+    """
+    Bot player: grab a random box outside the truck and push it into the trailer through its open back, repeat
+
+    Each box takes steps_per_move simulation steps, split evenly between
+    lifting it clear of the pile, carrying it over to the trailer's back,
+    lowering it in line with the door, pushing it in towards the cab and
+    waiting for it to land after letting go.
+    """
+    def __init__(self, rng, steps_per_move, choices=5):
+        """
+        :param rng: random.Random
+        :param steps_per_move: int
+        :param choices: int, how many of the highest boxes to choose from
+        """
+        self.rng = rng
+        self.steps_per_move = max(5, steps_per_move)
+        self.choices = choices
+        self.step = 0
+        self.waypoints = None
+
+    def __call__(self, game):
+        if self.step == 0 and not self.grab(game):
+            return  # nothing to grab yet, try again next step
+
+        leg, step = divmod(self.step, self.steps_per_move // 5)
+        if game.boxes.box_selected and leg < len(self.waypoints) - 1:
+            (x1, y1), (x2, y2) = self.waypoints[leg:leg + 2]
+            t = (step + 1) / (self.steps_per_move // 5)
+            game.mouse_pos = int(x1 + (x2 - x1) * t), int(y1 + (y2 - y1) * t)
+        elif game.boxes.box_selected:
+            game.boxes.toggle(game.mouse_pos, game.all_sprites)
+        self.step = (self.step + 1) % self.steps_per_move
+
+    def grab(self, game):
+        trailer = trailer_rect(game)
+        outside = sorted((box for box in game.boxes if box.sleeping and box not in game.boxes.in_truck),
+                         key=lambda box: box.rect.top)
+        box = next_box(outside, door_rect(game, trailer), self.rng, self.choices)
+        if box is None or grab(game, box) is None:
+            return False
+        if self.rng.random() < 0.5:
+            game.boxes.rotate_selected(90)
+
+        height = box.rect.height
+        y = self.rng.randint(trailer.top + height // 2 + 1, max(trailer.top + height // 2 + 1,
+                                                                trailer.bottom - height // 2 - 1))
+        self.waypoints = route(game, box, trailer, y)
+        return True
+
+
+def start_worker(args):
+    global session_game, settings
+    session_game = main.Game((args.width, args.height), args.scale, headless=True)
+    session_game.game_time = args.game_time
+    session_game.num_boxes = args.boxes
+    settings = args
+
+
+def play(seed):
+    """
+    Worker: play one session from its seed and return how it ended
+
+    :param seed: int
+    :return: dict
+    """
+    session_game.reseed(seed)
+    session_game.reset()
+    if settings.item_values:
+        session_game.score_counter.item_values.update(settings.item_values)
+    if settings.weights:
+        session_game.boxes.weights = settings.weights
+    return session_game.play(Mover(random.Random(seed), round(settings.move_time / session_game.timestep)))
+
+
+def main_sessions():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first session, the rest count up from it")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--boxes", type=int, default=50, help="boxes per game, Game.num_boxes")
+    parser.add_argument("--game-time", type=float, default=120, help="seconds per game, Game.game_time")
+    parser.add_argument("--item-values", type=json.loads, default=None,
+                        help='JSON object of Score.item_values to override, e.g. \'{"dog": 20000}\'')
+    parser.add_argument("--weights", type=float, nargs="+", default=None, help="BoxController.weights to use")
+    parser.add_argument("--move-time", type=float, default=2.0, help="seconds of game time the bot takes per box")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--scale", type=int, default=None, help="SPRITE_SCALE, derived from the width by default")
+    parser.add_argument("--output", default=None, help="JSON file to write, printed to stdout if omitted")
+    args = parser.parse_args()
+
+    seeds = range(args.seed, args.seed + args.sessions)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=start_worker, initargs=(args,)) as pool:
+        # sessions take about as long as each other, so hand them out in chunks to keep the workers busy
+        results = list(pool.map(play, seeds, chunksize=max(1, args.sessions // (args.workers * 4))))
+    seconds = time.perf_counter() - start
+
+    steps = sum(result["steps"] for result in results)
+    print(f"{args.sessions} sessions on {args.workers} workers in {seconds:.1f}s, "
+          f"{args.sessions / seconds:.2f} sessions/s, {steps / seconds:.0f} steps/s", file=sys.stderr)
+
+    packed = Counter(shape for result in results for shape in result["packed"])
+    report = {"commit": commit(), "config": {key: value for key, value in vars(args).items() if key != "output"},
+              "seconds": round(seconds, 3), "sessions_per_second": round(args.sessions / seconds, 3),
+              "steps_per_second": round(steps / seconds),
+              "distributions": {name: percentiles([result[name] for result in results], SPREAD_PERCENTILES)
+                                for name in ("score", "base_score", "efficiency", "total_score")},
+              "boxes_packed": percentiles([len(result["packed"]) for result in results], SPREAD_PERCENTILES),
+              "grades": dict(Counter(result["grade"] for result in results).most_common()),
+              "packed_per_session": {shape: round(count / len(results), 3) for shape, count in packed.most_common()},
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main_sessions()
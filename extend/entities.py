@@ -1,6 +1,10 @@
 import random
 
+import backend.systems.assets
 import backend.systems.physics
+import backend.systems.picking
+import backend.systems.profiling
+import backend.systems.text
 import pygame
 
 
@@ -28,22 +32,25 @@ class RestartGameException(Exception):
     pass
 
 
-class Timer(pygame.font.Font):
-    def __init__(self, size, max_time, aa=True):
+class Timer(backend.systems.text.CachedFont):
+    def __init__(self, size, max_time, aa=True, music=True):
         super(Timer, self).__init__(None, size)
         self.max_time = max_time
         self.time = max_time
         self.aa = aa
+        self.music = music  # switch to the low time theme near the end
 
         self.low_time = False
+        self.preload_glyphs("0123456789:", self.aa, (0, 0, 0))  # the time is assembled from cached glyphs
 
     def update(self, milliseconds_passed):
         self.time -= milliseconds_passed / 1000
 
         if self.time < self.max_time / 10 and not self.low_time:
-            pygame.mixer.music.load("assets/sound/time_low.wav")
-            pygame.mixer.music.set_volume(0.4)
-            pygame.mixer.music.play(-1)
+            if self.music:
+                pygame.mixer.music.load("assets/sound/time_low.wav")
+                pygame.mixer.music.set_volume(0.4)
+                pygame.mixer.music.play(-1)
             self.low_time = True
 
         if self.time <= 0:
@@ -51,14 +58,16 @@ class Timer(pygame.font.Font):
             return None
 
         m, s = divmod(self.time, 60)
-        return self.render(f"{m:02.0f}:{s:02.0f}", self.aa, (0, 0, 0))
+        return self.render_glyphs(f"{m:02.0f}:{s:02.0f}", self.aa, (0, 0, 0))
 
 
-class Score(pygame.font.Font):
+class Score(backend.systems.text.CachedFont):
     def __init__(self, size, score=0, aa=True):
         super(Score, self).__init__(None, size)
         self.score = score
         self.boxes_in_truck = []
+        self.truck_version = 0
+        self.area = 0  # trailer area covered at the last update
         self.aa = aa
 
         self.item_values = {"large crate": 1000,
@@ -70,27 +79,40 @@ class Score(pygame.font.Font):
                             "pipe": 750,
                             "big table": 5000,
                             "chair": 2500}
+        self.preload_glyphs("-0123456789", self.aa, (0, 0, 0))  # the score is assembled from cached glyphs
 
     def update(self, box_controller, truck):
+        backend.systems.profiling.profiler.start("scoring")
+        try:
+            return self.update_display(box_controller, truck)
+        finally:
+            backend.systems.profiling.profiler.stop("scoring")
+
+    def update_display(self, box_controller, truck):
         area, boxes_in_truck = box_controller.area_in_truck(truck)
-        if boxes_in_truck != self.boxes_in_truck:
-            new_boxes = [x for x in boxes_in_truck if x not in self.boxes_in_truck]
+        previous_area, self.area = self.area, area
+        if box_controller.truck_version != self.truck_version:
+            # membership changed since we last scored
+            self.truck_version = box_controller.truck_version
+            old_boxes = set(self.boxes_in_truck)
+            new_boxes = [x for x in boxes_in_truck if x not in old_boxes]
 
             if new_boxes:
                 self.boxes_in_truck = boxes_in_truck
                 return self.update_score(self.calc_score(area, new_boxes, truck))
             else:
-                removed_boxes = [x for x in self.boxes_in_truck if x not in boxes_in_truck]
+                current_boxes = set(boxes_in_truck)
+                removed_boxes = [x for x in self.boxes_in_truck if x not in current_boxes]
                 self.boxes_in_truck = boxes_in_truck
-                return self.update_score(self.calc_score(area, removed_boxes, truck, remove=True))
+                return self.update_score(self.calc_score(previous_area, removed_boxes, truck, remove=True))
 
-        return self.render(f"{self.score:011.0f}", self.aa, (0, 0, 0))
+        return self.render_glyphs(f"{self.score:011.0f}", self.aa, (0, 0, 0))
 
     def calc_score(self, area, new_boxes, truck, remove=False):
+        # removed boxes take back what they were worth at the area before they left
         values = [self.item_values[box.shape] for box in new_boxes]
         if remove:
             score = -sum(values)
-            area += sum([box.get_area() for box in new_boxes])
         else:
             score = sum(values)
 
@@ -100,7 +122,7 @@ class Score(pygame.font.Font):
 
     def update_score(self, increment):
         self.score += increment
-        return self.render(f"{self.score:011.0f}", self.aa, (0, 0, 0))
+        return self.render_glyphs(f"{self.score:011.0f}", self.aa, (0, 0, 0))
 
 
 class ScoreBreakdown(object):
@@ -110,9 +132,9 @@ class ScoreBreakdown(object):
         self.truck = truck
         self.aa = aa
 
-        self.base_score = pygame.font.Font(None, 96)
-        self.efficiency = pygame.font.Font(None, 96)
-        self.total_score = pygame.font.Font(None, 128)
+        self.base_score = backend.systems.text.CachedFont(None, 96)
+        self.efficiency = backend.systems.text.CachedFont(None, 96)
+        self.total_score = backend.systems.text.CachedFont(None, 128)
 
     @staticmethod
     def closest_value(n, ls):
@@ -132,11 +154,19 @@ class ScoreBreakdown(object):
 
         return grades[self.closest_value(efficiency, grades.keys())]
 
-    def update(self):
+    def calculate(self):
+        """
+        Return the final base score, trailer efficiency as a fraction and total score
+
+        :return: tuple(int, float, float)
+        """
         base_value = sum([self.score.item_values[box.shape] for box in self.score.boxes_in_truck])
         area, boxes_in_truck = self.box_controller.area_in_truck(self.truck)
         efficiency = area / self.truck.trailer_area
-        total_score = base_value * efficiency
+        return base_value, efficiency, base_value * efficiency
+
+    def update(self):
+        base_value, efficiency, total_score = self.calculate()
         return self.base_score.render(f"Base Score: {base_value:.0f}", self.aa, (0, 0, 0)), \
                self.efficiency.render(f"Grade: {self.get_grade(efficiency * 100)}", self.aa, (0, 0, 0)), \
                self.total_score.render(f"Final Score: {total_score:.0f}", self.aa, (0, 0, 0))
@@ -146,33 +176,31 @@ class Button(backend.systems.entities.StaticSprite):
     def __init__(self, sprite_paths, scale=1.0):
         super(Button, self).__init__(0, 0, sprite_paths, scale)
         self.cooldown = 0
-        self.select_sound = pygame.mixer.Sound("assets/sound/select.wav")
+        self.select_sound = backend.systems.assets.assets.sound("assets/sound/select.wav")
         self.select_sound.set_volume(0.25)
-        self.select_played = False
+        self.hovered = False
 
     def set_pos(self, x, y):
         self.rect.topleft = x, y
+        self.notify_moved()
 
-    def update(self, *args):
+    def hover(self, hovered):
+        # called by a Picker when the mouse moves onto or off the button
+        self.hovered = hovered
+        if hovered and not self.cooldown:
+            self.select_sound.play()
         if not self.cooldown:
-            mouse = pygame.mouse.get_pos()
-            if self.rect.collidepoint(mouse[0], mouse[1]):
-                self.image = self.sprites["hover"]
-                if not self.select_played:
-                    self.select_sound.play()
-                    self.select_played = True
-            else:
-                self.image = self.sprites["base"]
-                self.select_played = False
-        else:
-            self.cooldown -= 1
+            self.image = self.sprites["hover" if hovered else "base"]
 
-    def pressed(self):
-        mouse = pygame.mouse.get_pos()
+    def update(self, *args):
+        if self.cooldown:
+            self.cooldown -= 1
+            if not self.cooldown:
+                self.image = self.sprites["hover" if self.hovered else "base"]
 
+    def press(self):
         self.image = self.sprites["pressed"]
         self.cooldown = 25
-        return True if self.rect.collidepoint(mouse[0], mouse[1]) else False
 
 
 class RestartButton(Button):
@@ -204,12 +232,33 @@ class ControlsButton(Button):
 
 
 class Truck(backend.systems.entities.StaticSprite):
-    def __init__(self, x, y, sprite, scale=1.0):
+    trailer_cache = {}  # (image key, scale) -> trailer mask, so it is only ever built once
+
+    def __init__(self, x, y, sprite, scale=1.0, key=None):
+        """
+        :param sprite: pygame.Surface
+        :param scale: float
+        :param key: hashable, identifies the sprite's image, e.g. SpriteAtlas.key, the mask isn't cached without one
+        """
         super(Truck, self).__init__(x, y, {"base": sprite}, scale)
         self._trailer_area = None
 
+        if key is None:
+            self.trailer_mask = self.build_trailer_mask(self.image)
+        else:
+            if (key, scale) not in self.trailer_cache:
+                self.trailer_cache[key, scale] = self.build_trailer_mask(self.image)
+            self.trailer_mask = self.trailer_cache[key, scale]
+
         self.trailer_area = None
 
+    @staticmethod
+    def build_trailer_mask(image):
+        # the trailer is painted with alpha 50, so take pixels with alpha above 49 and remove those above 50
+        mask = pygame.mask.from_surface(image, 49)
+        mask.erase(pygame.mask.from_surface(image, 50), (0, 0))
+        return mask
+
     @property
     def trailer_area(self):
         if not self._trailer_area:
@@ -221,83 +270,211 @@ class Truck(backend.systems.entities.StaticSprite):
         if value:
             self._trailer_area = value
         else:
-            image_size = self.image.get_size()
-            count = 0
-            for x in range(image_size[0]):
-                for y in range(image_size[1]):
-                    if self.image.get_at((x, y))[3] == 50:
-                        count += 1
-            self._trailer_area = count
+            self._trailer_area = self.trailer_mask.count()
 
 
 class BoxController(pygame.sprite.Group):
     def __init__(self, spritesheet, surface, scale, *sprites):
+        # truck membership is tracked incrementally, only boxes that moved since the last check are retested
+        self.in_truck = {}  # box -> (mask, offset, rect) it was drawn into the occupancy bitmap with
+        self.truck_area = 0
+        self.truck_version = 0  # bumped whenever membership changes
+        self.pending = {}
+        self.erased = []  # contributions of boxes removed from the group, taken out on the next check
+
+        # pixels of the trailer covered by boxes, kept current by drawing and erasing box masks
+        self.occupancy = None
+        self.outside = None  # everything that isn't trailer, erased from the bitmap after drawing
+
         super(BoxController, self).__init__(*sprites)
         self.box_selected = None
         self.scale = scale
         self.surface = surface
         self.weights = [0.04, 0.04, 0.04, 0.04, 0.5, 0.01, 0.2, 0.5, 0.5]
-        self.images = {"large crate": spritesheet.image_at(pygame.Rect(0, 0, 32, 32)),
-                       "small crate": spritesheet.image_at(pygame.Rect(32, 0, 16, 16)),
-                       "long crate": spritesheet.image_at(pygame.Rect(32, 16, 32, 16)),
-                       "small box": spritesheet.image_at(pygame.Rect(48, 0, 16, 16)),
-                       "table": spritesheet.image_at(pygame.Rect(64, 0, 32, 32)),
-                       "dog": spritesheet.image_at(pygame.Rect(96, 0, 32, 32)),
-                       "pipe": spritesheet.image_at(pygame.Rect(128, 0, 32, 32)),
-                       "big table": spritesheet.image_at(pygame.Rect(160, 0, 64, 32)),
-                       "chair": spritesheet.image_at(pygame.Rect(224, 0, 32, 64))}
-
-    def populate(self, num_boxes, *other_groups):
+        # box images come pre-scaled from the sheet's atlas
+        regions = {"large crate": pygame.Rect(0, 0, 32, 32),
+                   "small crate": pygame.Rect(32, 0, 16, 16),
+                   "long crate": pygame.Rect(32, 16, 32, 16),
+                   "small box": pygame.Rect(48, 0, 16, 16),
+                   "table": pygame.Rect(64, 0, 32, 32),
+                   "dog": pygame.Rect(96, 0, 32, 32),
+                   "pipe": pygame.Rect(128, 0, 32, 32),
+                   "big table": pygame.Rect(160, 0, 64, 32),
+                   "chair": pygame.Rect(224, 0, 32, 64)}
+        atlas = spritesheet.atlas(scale, regions)
+        self.images = {name: atlas.image(name) for name in regions}
+
+    def populate(self, num_boxes, *other_groups, attempts=10):
+        """
+        Drop boxes at random over the right half of the screen
+
+        Each box goes in one of a few random spots that doesn't overlap the boxes
+        already dropped, or failing that is lifted on top of the boxes in its way
+        as long as part of it stays on screen. Boxes that fit neither way are left
+        overlapping in their last random spot, for the contact solver to separate
+        where there's room, and aren't tested against, so placing stays quick
+        however many boxes there are.
+
+        :param num_boxes: int
+        :param other_groups: groups the boxes are added to as well
+        :param attempts: int, random spots tried per box
+        """
         width, height = self.surface.get_size()
-        for box in range(num_boxes):
+        placed = backend.systems.spatial.SpatialHash(64 * self.scale)  # boxes dropped apart so far
+        for _ in range(num_boxes):
             selector = random.choices(list(self.images.keys()), self.weights)[0]
-            Box(random.randint(width / 2, width), random.randint(0, height - 96 * self.scale),
-                self.images[selector], selector, self.scale).add(self, *other_groups)
+            image = self.images[selector]
+            box = Box(0, 0, image, selector)
+            box.world = self.surface.get_rect()
+            for attempt in range(attempts):
+                box.rect.topleft = (random.randint(width / 2, width - image.get_width()),
+                                    random.randint(0, height - 96 * self.scale))
+                blocking = self.overlapping(box, placed)
+                if not blocking:
+                    break
+            spot = box.rect.topleft
+            while blocking:
+                box.rect.bottom = min(other.rect.top for other in blocking)
+                if box.rect.bottom <= 0:
+                    box.rect.topleft = spot  # no room above either, the screen is full here
+                    break
+                blocking = self.overlapping(box, placed)
+            if not blocking:
+                placed.insert(box)
+            box.add(self, *other_groups)
 
-    def toggle(self):
+    @staticmethod
+    def overlapping(box, placed):
+        # boxes in the SpatialHash placed that the box's pixels overlap
+        return [other for other in placed.query(box.rect)
+                if box.rect.colliderect(other.rect) and backend.systems.entities.collide_mask(box, other)]
+
+    def toggle(self, pos=None, index=None):
+        """
+        Pick up the box drawn at pos, or drop the held one
+
+        Picking goes through index, a spatially indexed group holding the boxes in draw order, when one is given.
+
+        :param pos: tuple
+        :param index: pygame.sprite.Group
+        """
+        pos = pygame.mouse.get_pos() if pos is None else pos
         if not self.box_selected:
-            for box in self.sprites():
-                if box.rect.collidepoint(pygame.mouse.get_pos()):
-                    box.toggle()
-                    self.box_selected = box
-                    break
+            box = backend.systems.picking.pick(self if index is None else index, pos, self)
+            if box:
+                box.toggle()
+                self.box_selected = box
         else:
             self.box_selected.toggle()
             self.box_selected = None
 
+    def drag(self, target, colliders):
+        # move the held box towards the target, normally the mouse
+        if self.box_selected:
+            self.box_selected.move_to_target(target, colliders)
+
     def rotate_selected(self, angle):
         if self.box_selected:
             self.box_selected.rotate(self.box_selected.angle + angle)
 
-    def area_in_truck(self, truck):
-        boxes_in_truck = []
-        for box in self.sprites():
-            if pygame.sprite.collide_rect(box, truck):
-                boxes_in_truck.append(box)
+    def add_internal(self, sprite, layer=None):
+        super(BoxController, self).add_internal(sprite, layer)
+        self.pending[sprite] = None
+
+    def remove_internal(self, sprite):
+        super(BoxController, self).remove_internal(sprite)
+        self.pending.pop(sprite, None)
+        if sprite in self.in_truck:
+            self.erased.append(self.in_truck.pop(sprite))
+            self.truck_version += 1
 
-        return sum([box.get_area() for box in boxes_in_truck]), boxes_in_truck
+    def sprite_moved(self, sprite):
+        # called through notify_moved whenever a box moves or rotates
+        self.pending[sprite] = None
+
+    def area_in_truck(self, truck):
+        """
+        Return the exact number of trailer pixels covered by boxes, and the boxes covering any
+
+        Boxes that moved, rotated or left since the last call have their old
+        masks erased from the occupancy bitmap and their new ones drawn in. Boxes
+        overlapping an erased mask are drawn again so shared pixels aren't lost.
+
+        :param truck: Truck
+        :return: tuple(int, list)
+        """
+        if self.occupancy is None or self.occupancy.get_size() != truck.trailer_mask.get_size():
+            self.occupancy = pygame.mask.Mask(truck.trailer_mask.get_size())
+            self.outside = truck.trailer_mask.copy()
+            self.outside.invert()
+            self.pending.update(dict.fromkeys(self.in_truck))
+            self.in_truck.clear()
+
+        if not self.pending and not self.erased:
+            return self.truck_area, list(self.in_truck)
+
+        was_in_truck = {}
+        for box in self.pending:
+            if box in self.in_truck:
+                self.erased.append(self.in_truck.pop(box))
+                was_in_truck[box] = None
+        for mask, offset, rect in self.erased:
+            self.occupancy.erase(mask, offset)
+        for box, (mask, offset, rect) in self.in_truck.items():
+            if rect.collidelist([erased_rect for _, _, erased_rect in self.erased]) != -1:
+                self.occupancy.draw(mask, offset)
+
+        for box in self.pending:
+            offset = box.rect.x - truck.rect.x, box.rect.y - truck.rect.y
+            if truck.trailer_mask.overlap(box.mask, offset):
+                self.in_truck[box] = box.mask, offset, box.rect.copy()
+                self.occupancy.draw(box.mask, offset)
+            if (box in self.in_truck) != (box in was_in_truck):
+                self.truck_version += 1
+
+        self.occupancy.erase(self.outside, (0, 0))
+        self.truck_area = self.occupancy.count()
+        self.pending.clear()
+        self.erased = []
+
+        return self.truck_area, list(self.in_truck)
 
     def draw(self, surface):
         for sprite in self.sprites():
             sprite.draw(surface)
 
+    def overlays(self):
+        # selection overlays as (key, image, rect) items for a DirtyRenderer
+        return [((sprite, "selector"), sprite.selector_overlay(), sprite.rect) for sprite in self.sprites()
+                if sprite.held]
+
 
 class Box(backend.systems.physics.PhysicsMixin, backend.systems.entities.DynamicSprite):
+    areas = {}  # (shape, size, angle) -> pixel count, shared by every box
+    selector_overlays = {}  # rect size -> selection overlay surface
+
     def __init__(self, x, y, sprite, shape, scale=1.0):
         super(Box, self).__init__(x, y, {"base": sprite}, scale)
 
         self.held = False
         self.shape = shape
+        self.swept = True  # held boxes travel far enough in one frame to tunnel through thin tiles
+        self.world = None  # pygame.Rect of the level, boxes that fall below it are removed
 
-    def update(self, colliders, surface, cam):
-        if not self.fall:
-            self.check_falling(colliders)
-        else:
-            self.fall = self.check_collisions((0, self.y_vel), 1, colliders)
-        self.physics_update()
+    def update(self, colliders, surface, cam, dt=backend.systems.physics.TIMESTEP):
+        if not self.sleeping:
+            previous = self.rect.copy()
 
-        if self.held:
-            self.move_to_target(pygame.mouse.get_pos(), colliders)
+            if not self.fall:
+                self.check_falling(colliders)
+            else:
+                self.fall = self.check_collisions((0, self.y_vel), 1, colliders)
+            self.physics_update(dt)
+
+            self.settle(self.held or self.rect != previous)
+            if self.fall and self.world is not None and self.rect.top > self.world.bottom:
+                self.kill()  # fell off the edge of the world, nothing can ever reach it again
+                return
 
         super(Box, self).update(colliders, surface, cam)
 
@@ -307,6 +484,7 @@ class Box(backend.systems.physics.PhysicsMixin, backend.systems.entities.Dynamic
 
     def toggle(self):
         self.held = False if self.held else True
+        self.wake_area(self.rect)
 
     def move_to_target(self, target, colliders):
         dx = target[0] - self.rect.center[0]
@@ -315,17 +493,30 @@ class Box(backend.systems.physics.PhysicsMixin, backend.systems.entities.Dynamic
         self.move(dx, dy, colliders)
 
     def draw_selector(self, surface):
+        surface.blit(self.selector_overlay(), self.rect.topleft)
+
+    def selector_overlay(self):
+        # overlays only depend on the rect size, so they are built once per size and shared
+        overlay = self.selector_overlays.get(self.rect.size)
+        if overlay:
+            return overlay
+
         color_key = (127, 33, 33)
+        backend.systems.profiling.profiler.count("surfaces")
         overlay = pygame.Surface(self.rect.size)
         overlay.fill(color_key)
         overlay.set_colorkey(color_key)
         pygame.draw.circle(overlay, (255, 255, 0), [x // 2 for x in self.rect.size], self.rect.width // 4, 5)
         overlay.set_alpha(75)
 
-        surface.blit(overlay, self.rect.topleft)
+        self.selector_overlays[self.rect.size] = overlay
+        return overlay
 
     def get_area(self):
-        return self.mask.count()
+        key = self.shape, self.sprites["base"].get_size(), self.angle
+        if key not in self.areas:
+            self.areas[key] = self.mask.count()
+        return self.areas[key]
 
 
 class Ground(backend.systems.entities.StaticSprite):
@@ -1,5 +1,10 @@
+import argparse
+import json
 import math
+import os
+import random
 import sys
+import zlib
 
 import pygame
 
@@ -10,48 +15,135 @@ import extend.entities
 WHITE = 255, 255, 255
 SKY = 176, 210, 232
 
+# Scenes
+MENU = "menu"
+INTRO = "intro"
+PLAYING = "playing"
+GAME_OVER = "game over"
+
+# posted by the mixer when the intro jingle finishes
+MUSIC_END = pygame.USEREVENT + 1
+
+# keys the game reads from pygame.key.get_pressed() and events it handles, the only input recorded
+RECORDED_KEYS = pygame.K_ESCAPE, pygame.K_LEFTBRACKET, pygame.K_RIGHTBRACKET, pygame.K_r
+RECORDED_EVENTS = (pygame.QUIT, pygame.KEYDOWN, pygame.KEYUP, pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN,
+                   pygame.MOUSEBUTTONUP, MUSIC_END)
+
 
 class Game(object):
     """
     Control main loop and game states
     """
 
-    def __init__(self):
+    def __init__(self, resolution=None, sprite_scale=None, fullscreen=True, atlas_cache=None, seed=None,
+                 headless=False):
         self.running = True
-        self.game_ended = False
-        self.menu_shown = False
 
-        # pygame setup
+        # headless games have no window, sound or frame cap, for simulating sessions as fast as they run
+        self.headless = headless
+        if headless:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+            os.environ["SDL_AUDIODRIVER"] = "dummy"
+            fullscreen = False
+
+        # pygame setup, defaults to fullscreen at the monitor's resolution
         pygame.init()
-        monitor_info = pygame.display.Info()
-        self.screen = pygame.display.set_mode((monitor_info.current_w, monitor_info.current_h), pygame.FULLSCREEN)
+        if not resolution:
+            monitor_info = pygame.display.Info()
+            resolution = monitor_info.current_w, monitor_info.current_h
+        self.screen = pygame.display.set_mode(resolution, pygame.FULLSCREEN if fullscreen else 0)
         self.RESOLUTION = self.width, self.height = self.screen.get_size()
-        self.SPRITE_SCALE = self.RESOLUTION[0] // 512
+        self.SPRITE_SCALE = sprite_scale or self.RESOLUTION[0] // 512
 
         self.camera = backend.systems.camera.Camera(backend.systems.camera.simple_camera, (self.width, self.height))
         self.clock = pygame.time.Clock()
 
-        self.fps = 60
+        self.fps = 0 if headless else 60  # 0 leaves Clock.tick uncapped
         self.keys = None
+        self.mouse_pos = (0, 0)
+        self.num_boxes = 50
         self.game_time = 120
 
-        self.timer = extend.entities.Timer(32, self.game_time)
+        # fixed timestep simulation, decoupled from the render rate
+        self.timestep = 1 / 60
+        self.max_frame_time = 0.25  # don't try to catch up on more than this much time after a stall
+        self.interpolate = False  # draw sprites between their last two simulated positions
+
+        # optional dirty rectangle rendering, F2 toggles it and F4 outlines the redrawn regions
+        self.dirty_rendering = False
+        self.renderer = backend.systems.rendering.DirtyRenderer(SKY)
+
+        # F3 toggles the profiler and its overlay
+        self.profiler = backend.systems.profiling.profiler
+        self.profiler_overlay = backend.systems.profiling.ProfilerOverlay(self.profiler)
+        self.show_profiler = False
+
+        self.particles = backend.systems.particles.particle_pool
+
+        self.reseed(seed)
+        self.recorder = None
+        self.replay = None
+
+        # overlapping boxes are pushed apart along their contact normals after every step
+        self.contacts = backend.systems.contacts.ContactSolver(bounds=self.screen.get_rect())
+
+        # scaled spritesheets are saved here and reused on the next run, if set
+        self.atlas_cache = atlas_cache
+
+        # everything is loaded once here, restarts reuse it from the registry
+        self.assets = backend.systems.assets.assets
+        self.assets.preload(["assets/sprites/boxes.png", "assets/sprites/environment.png"])
+        self.assets.preload(["assets/sprites/logo.png"] +
+                            [f"assets/sprites/buttons/{name}_button{state}.png"
+                             for name in ("start", "restart", "quit") for state in ("", "_hover", "_pressed")],
+                            ["assets/sound/select.wav"], (self.SPRITE_SCALE,))
+        self.assets.preload(sounds=["assets/sound/game_start.wav"])
+
+        # menu -> intro -> playing -> game over, the main loop keeps running through every transition
+        self.scenes = backend.systems.scenes.SceneMachine()
+        self.scenes.register(MENU, self.show_menu, self.hide_menu)
+        self.scenes.register(INTRO, self.play_intro, self.end_intro)
+        self.scenes.register(PLAYING, self.setup_level)
+        self.scenes.register(GAME_OVER, self.game_over)
+
+        self.reset()
+
+    def reset(self):
+        """
+        Set up a fresh game on the menu, reusing the display and every loaded asset
+        """
+        self.accumulator = 0.0
+
+        self.timer = extend.entities.Timer(32, self.game_time, music=not self.headless)
         self.score_counter = extend.entities.Score(40)
 
         self.timer_display = None
         self.score_display = None
+        self.final_displays = []
+
+        # ground and truck never move, they are drawn from one cached background and collide as one mask
+        self.static_layer = backend.systems.static.StaticLayer(SKY)
+        self.renderer.invalidate()
+
+        self.particles.clear()
+        self.particle_bounds = None
+        self.update_rects = []
 
         # spritesheets
-        self.box_sprites = backend.systems.spritesheets.SpriteSheet("assets/sprites/boxes.png")
-        self.environment = backend.systems.spritesheets.SpriteSheet("assets/sprites/environment.png")
+        self.box_sprites = backend.systems.spritesheets.SpriteSheet("assets/sprites/boxes.png", self.atlas_cache)
+        self.environment = backend.systems.spritesheets.SpriteSheet("assets/sprites/environment.png", self.atlas_cache)
+        self.environment_atlas = self.environment.atlas(self.SPRITE_SCALE, {"truck": pygame.Rect(0, 0, 256, 128),
+                                                                            "ground": pygame.Rect(32 * 8, 0, 32, 32)})
 
         # group setup
-        self.all_sprites = pygame.sprite.Group()
-        self.colliders = pygame.sprite.Group()
+        self.all_sprites = backend.systems.spatial.SpatialGroup(cell_size=self.SPRITE_SCALE * 128)  # culled by the camera
+        self.picker = backend.systems.picking.Picker(self.all_sprites, self.mouse_pos)  # hover and clicks
+        self.colliders = backend.systems.spatial.SpatialGroup(cell_size=self.SPRITE_SCALE * 32)
 
         self.boxes = extend.entities.BoxController(self.box_sprites, self.screen, self.SPRITE_SCALE)
         self.truck = extend.entities.Truck(32, self.height - (self.SPRITE_SCALE * 160),
-                                           self.environment.image_at(pygame.Rect(0, 0, 256, 128)), self.SPRITE_SCALE)
+                                           self.environment_atlas.image("truck"),
+                                           key=self.environment_atlas.key("truck"))
 
         self.final_score = extend.entities.ScoreBreakdown(self.score_counter, self.boxes, self.truck)
         self.restart_button = extend.entities.RestartButton(self.SPRITE_SCALE)
@@ -62,21 +154,33 @@ class Game(object):
         self.logo = backend.systems.entities.StaticSprite(0, 0, {"base": "assets/sprites/logo.png"}, self.SPRITE_SCALE)
 
         # sound setup
-        pygame.mixer.music.load("assets/sound/theme.wav")
-        pygame.mixer.music.set_volume(0.4)
-        pygame.mixer.music.play(-1)
+        if not self.headless:
+            pygame.mixer.music.load("assets/sound/theme.wav")
+            pygame.mixer.music.set_volume(0.4)
+            pygame.mixer.music.play(-1)
+
+        self.scenes.change(MENU)
 
-        self.show_menu()
+    def reseed(self, seed):
+        """
+        Seed box placement and particles, making the next game reproducible
+
+        Used for recording and replaying sessions, and for simulating many games.
+
+        :param seed: int, or None to leave them unseeded
+        """
+        self.seed = seed
+        if seed is not None:
+            random.seed(seed)
+            self.particles.seed(seed)
 
     def create_floor(self):
         for x in range(int(math.ceil(self.width / (self.SPRITE_SCALE * 32)))):
-            extend.entities.Ground(x * (self.SPRITE_SCALE * 32), self.height - (self.SPRITE_SCALE * 32),
-                                   self.environment.image_at(pygame.Rect(32 * 8, 0, 32, 32)),
-                                   self.SPRITE_SCALE).add(self.colliders, self.all_sprites)
+            self.static_layer.add(extend.entities.Ground(x * (self.SPRITE_SCALE * 32),
+                                                         self.height - (self.SPRITE_SCALE * 32),
+                                                         self.environment_atlas.image("ground")))
 
     def show_menu(self):
-        self.menu_shown = True
-
         self.logo.rect.topleft = (self.width / 2 - self.logo.rect.width / 2,
                                   self.height / 5 - self.logo.rect.height / 5)
         self.logo.add(self.all_sprites)
@@ -84,37 +188,68 @@ class Game(object):
         self.start_button.set_pos(self.width / 2 - self.start_button.rect.width / 2,
                                   self.height - (self.height / 3 - self.start_button.rect.height / 3))
         self.start_button.add(self.all_sprites)
+        self.picker.refresh()
 
         # self.controls_button.set_pos(self.width / 2 - self.start_button.rect.width / 2,
         #                           self.height - (self.height / 5 - self.start_button.rect.height / 5))
         # self.controls_button.add(self.all_sprites)
 
-    def start_game(self):
-        pygame.mixer.music.load("assets/sound/game_start.wav")
-        pygame.mixer.music.play()
+    def hide_menu(self):
+        self.logo.kill()
+        self.start_button.kill()
+        # self.controls_button.kill()
+
+    def play_intro(self):
+        """
+        Play the start jingle and move on to the game when it ends
+
+        The mixer posts MUSIC_END when the jingle finishes. The jingle's length is used as a fallback
+        in case the event never arrives, e.g. without an audio device.
+        """
+        if not self.headless:
+            pygame.mixer.music.load("assets/sound/game_start.wav")
+            pygame.mixer.music.play()
+            pygame.mixer.music.set_endevent(MUSIC_END)  # set after loading, replacing the theme may post one too
 
-        while pygame.mixer.music.get_busy():
-            pass
+        length = self.assets.sound("assets/sound/game_start.wav").get_length()
+        self.scenes.after(PLAYING, length + 0.5, MUSIC_END)
+
+    def end_intro(self):
+        if self.headless:
+            return
+        pygame.mixer.music.set_endevent()
 
         pygame.mixer.music.load("assets/sound/theme.wav")
         pygame.mixer.music.play(-1)
 
-        self.menu_shown = False
-        self.logo.kill()
-        self.start_button.kill()
-        # self.controls_button.kill()
+    def start_game(self):
+        """
+        Start playing straight away, skipping the intro
+        """
+        self.scenes.change(PLAYING)
 
+    def setup_level(self):
         self.create_floor()  # add gorund to the scene
-        self.boxes.populate(50, self.colliders, self.all_sprites)  # add boxes to the scene
-        self.truck.add(self.all_sprites, self.colliders)  # add truck to scene
+        self.boxes.populate(self.num_boxes, self.colliders, self.all_sprites)  # add boxes to the scene
+        self.static_layer.add(self.truck)  # add truck to scene
+        self.static_layer.bake(self.screen.get_size())
+        self.static_layer.collider.add(self.colliders)
+
+    def event_loop(self, events=None):
+        self.profiler.start("events")
+        self.handle_events(pygame.event.get() if events is None else events)
+        self.profiler.stop("events")
+
+    def handle_events(self, events):
+        for event in events:
+            self.scenes.handle_event(event)
+            self.picker.handle_event(event)
 
-    def event_loop(self):
-        for event in pygame.event.get():
             if event.type == pygame.QUIT or self.keys[pygame.K_ESCAPE]:
                 self.running = False
             if event.type == pygame.MOUSEBUTTONUP:
                 if event.button == 1:
-                    self.boxes.toggle()
+                    self.boxes.toggle(self.mouse_pos, self.all_sprites)
                 if event.button == 4:
                     self.boxes.rotate_selected(5)
                 if event.button == 5:
@@ -127,46 +262,165 @@ class Game(object):
             if self.keys[pygame.K_r]:
                 self.restart()
 
-            if self.menu_shown:
-                if event.type == pygame.MOUSEBUTTONUP:
-                    if self.start_button.pressed():
-                        self.start_game()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F2:
+                    self.dirty_rendering = not self.dirty_rendering
+                    self.renderer.invalidate()
+                if event.key == pygame.K_F3:
+                    self.show_profiler = not self.show_profiler
+                    self.profiler.enable(self.show_profiler or self.profiler.stream is not None)
+                if event.key == pygame.K_F4:
+                    self.renderer.debug = not self.renderer.debug
+
+            if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                self.click(self.picker.pick(event.pos))
+
+    def click(self, sprite):
+        if isinstance(sprite, extend.entities.Button):
+            sprite.press()
+
+        if self.scenes.state == MENU:
+            if sprite is self.start_button:
+                self.scenes.change(INTRO)
+
+        if self.scenes.state == GAME_OVER:
+            if sprite is self.restart_button:
+                self.restart()
+            if sprite is self.quit_button:
+                self.running = False
 
-            if self.game_ended:
-                if event.type == pygame.MOUSEBUTTONUP:
-                    if self.restart_button.pressed():
-                        self.restart()
-                    if self.quit_button.pressed():
-                        self.running = False
+    def update(self, dt):
+        self.profiler.start("update")
+        self.step(dt)
+        self.profiler.stop("update")
 
-    def update(self):
-        self.keys = pygame.key.get_pressed()
-        self.all_sprites.update(self.colliders, self.screen, self.camera)
+    def step(self, dt):
+        self.scenes.update(dt)
 
-        if not self.game_ended and not self.menu_shown:
-            self.timer_display = self.timer.update(self.clock.get_time())
-            self.score_display = self.score_counter.update(self.boxes, self.truck)
+        if self.interpolate:
+            for sprite in self.all_sprites:
+                sprite.previous_rect = sprite.rect.copy()
 
-    def draw(self):
-        self.screen.fill(SKY)
-        for sprite in self.all_sprites:
-            self.screen.blit(sprite.image, self.camera.apply(sprite))
+        self.all_sprites.update(self.colliders, self.screen, self.camera, dt)
+        if self.scenes.state == PLAYING:
+            self.boxes.drag(self.mouse_pos, self.colliders)
+            self.contacts.solve([box for box in self.boxes if not box.sleeping and not box.held], self.colliders)
+        self.particles.update()
 
-        self.boxes.draw(self.screen)
+        if self.scenes.state == PLAYING:
+            self.timer_display = self.timer.update(dt * 1000)
+            self.score_display = self.score_counter.update(self.boxes, self.truck)
+            if self.timer.time <= 0:
+                self.scenes.change(GAME_OVER)
+
+    def simulate(self, steps):
+        # advance the simulation as fast as possible, e.g. when running headless
+        for _ in range(steps):
+            self.update(self.timestep)
+
+    def play(self, player=None):
+        """
+        Play one game from start to game over as fast as it simulates, without drawing or reading any input
+
+        The player stands in for the mouse and keyboard: it is called before
+        every step and can move Game.mouse_pos and pick up, rotate and drop
+        boxes through Game.boxes.
+
+        :param player: callable, taking the game
+        :return: dict, how the game ended
+        """
+        self.start_game()
+        steps = 0
+        while self.scenes.state == PLAYING:
+            if player:
+                player(self)
+            self.update(self.timestep)
+            steps += 1
+
+        base_score, efficiency, total_score = self.final_score.calculate()
+        return {"seed": self.seed, "steps": steps, "score": self.score_counter.score, "base_score": base_score,
+                "efficiency": efficiency, "total_score": total_score,
+                "grade": self.final_score.get_grade(efficiency * 100),
+                "boxes": len(self.boxes), "packed": [box.shape for box in self.score_counter.boxes_in_truck]}
+
+    def draw_list(self, alpha=1.0):
+        """
+        Everything to draw this frame as (key, image, screen rect), back to front
+        """
+        items = []
+        for sprite in self.camera.cull(self.all_sprites):
+            if self.interpolate:
+                items.append((sprite, sprite.image, self.camera.apply_interpolated(sprite, alpha)))
+            else:
+                items.append((sprite, sprite.image, self.camera.apply(sprite)))
+        return items + self.overlay_list()
+
+    def overlay_list(self):
+        """
+        Everything drawn over the sprites as (key, image, screen rect), back to front
+        """
+        items = self.boxes.overlays()
 
         if self.score_display:
-            self.screen.blit(self.score_display, self.screen.blit(self.score_display, (
-            self.width / 2 - self.score_display.get_rect().width / 2, 16)))
+            items.append(("score", self.score_display, self.score_display.get_rect(
+                topleft=(self.width / 2 - self.score_display.get_rect().width / 2, 16))))
         if self.timer_display:
-            self.screen.blit(self.timer_display, (self.width / 2 - self.timer_display.get_rect().width / 2, 48))
-        if self.timer.time <= 0:
-            self.game_over()
+            items.append(("timer", self.timer_display, self.timer_display.get_rect(
+                topleft=(self.width / 2 - self.timer_display.get_rect().width / 2, 48))))
+        items.extend(self.final_displays)
+
+        if self.show_profiler:
+            overlay = self.profiler_overlay.render()
+            items.append((self.profiler_overlay, overlay, overlay.get_rect(topright=(self.width - 8, 8))))
+        return items
+
+    def draw(self, alpha=1.0):
+        self.profiler.start("draw")
+        self.draw_frame(alpha)
+        self.profiler.stop("draw")
+
+    def draw_frame(self, alpha):
+        self.static_layer.bake(self.screen.get_size())
+        if self.renderer.background is not self.static_layer.surface:
+            self.renderer.background = self.static_layer.surface
+            self.renderer.invalidate()
+
+        if self.dirty_rendering:
+            # particles are drawn over the renderer's output, so clear where they were and where they are now
+            particle_bounds = self.particles.bounds(self.camera.state.topleft)
+            self.update_rects = self.renderer.draw(self.screen, self.draw_list(alpha),
+                                                   [self.particle_bounds, particle_bounds])
+            self.particle_bounds = particle_bounds
+        else:
+            # only sprites on screen are drawn, with every blit submitted in one call
+            sprites = self.camera.cull(self.all_sprites)
+            if self.interpolate:
+                blits = [(sprite.image, self.camera.apply_interpolated(sprite, alpha)) for sprite in sprites]
+            else:
+                blits = self.camera.blit_sequence(sprites)
+            blits.extend((image, rect) for _, image, rect in self.overlay_list())
+
+            self.screen.blit(self.static_layer.surface, (0, 0))
+            self.screen.blits(blits, False)
+        self.particles.draw(self.screen, self.camera.state.topleft)
+
+    def present(self):
+        self.profiler.start("flip")
+        if self.dirty_rendering:
+            pygame.display.update(self.update_rects)
+        else:
+            pygame.display.flip()
+        self.profiler.stop("flip")
+        self.profiler.end_frame()
 
     def game_over(self):
-        self.game_ended = True
         base_score, efficiency, total_score = self.final_score.update()
         self.all_sprites.empty()
 
+        # the game over screen is just sky, and nothing is left to collide
+        self.static_layer.empty()
+        self.colliders.empty()
+
         self.restart_button.set_pos(self.width / 2 - self.restart_button.rect.width / 2,
                                     self.height - (self.height / 3 - self.restart_button.rect.height / 3))
         self.restart_button.add(self.all_sprites)
@@ -174,32 +428,118 @@ class Game(object):
         self.quit_button.set_pos(self.width / 2 - self.quit_button.rect.width / 2,
                                  self.height - (self.height / 5 - self.quit_button.rect.height / 5))
         self.quit_button.add(self.all_sprites)
+        self.picker.refresh()
 
-        self.screen.blit(base_score, (
-        self.width / 2 - base_score.get_rect().width / 2, self.height / 4 - base_score.get_rect().height))
-        self.screen.blit(efficiency, (
-        self.width / 2 - efficiency.get_rect().width / 2, self.height / 3 - efficiency.get_rect().height))
-        self.screen.blit(total_score, (
-        self.width / 2 - total_score.get_rect().width / 2, self.height / 2 - total_score.get_rect().height))
+        self.final_displays = [
+            ("base score", base_score, base_score.get_rect(topleft=(
+                self.width / 2 - base_score.get_rect().width / 2, self.height / 4 - base_score.get_rect().height))),
+            ("efficiency", efficiency, efficiency.get_rect(topleft=(
+                self.width / 2 - efficiency.get_rect().width / 2, self.height / 3 - efficiency.get_rect().height))),
+            ("total score", total_score, total_score.get_rect(topleft=(
+                self.width / 2 - total_score.get_rect().width / 2, self.height / 2 - total_score.get_rect().height)))]
 
     def restart(self):
-        self.__init__()
+        self.reset()
         raise extend.entities.RestartGameException("Restarting Game")
 
+    def record(self, path):
+        """
+        Record the seed and every frame's input to path, to be played back with Replay
+
+        :param path: str
+        """
+        self.recorder = backend.systems.replay.Recorder(path, {"seed": self.seed,
+                                                               "resolution": self.RESOLUTION,
+                                                               "sprite_scale": self.SPRITE_SCALE,
+                                                               "timestep": self.timestep},
+                                                     RECORDED_KEYS, RECORDED_EVENTS)
+
+    def summary(self):
+        # how the session ended, compared between a recording and its replay
+        positions = json.dumps([list(box.rect) for box in self.boxes]).encode()
+        return {"scene": self.scenes.state, "score": self.score_counter.score, "boxes": zlib.crc32(positions)}
+
     def main_loop(self):
         while self.running:
             try:
-                self.update()
-                self.event_loop()
-                self.draw()
-                pygame.display.flip()
-                self.clock.tick(self.fps)
+                self.frame()
             except extend.entities.RestartGameException:
                 continue
 
+    def frame(self):
+        """
+        Read input, from the devices or a replay, then simulate, handle events and draw one frame
+
+        Replays run as fast as possible, each frame taking the number of
+        simulation steps it took when it was recorded.
+        """
+        if self.replay:
+            pygame.event.pump()  # keep the window responsive, the events themselves come from the replay
+            frame = self.replay.next_frame()
+            if frame is None:
+                self.running = False
+                return
+            steps, self.mouse_pos, self.keys, events = frame
+        else:
+            self.accumulator += min(self.clock.tick(self.fps) / 1000, self.max_frame_time)
+            steps = 0
+            while self.accumulator >= self.timestep:
+                self.accumulator -= self.timestep
+                steps += 1
+            self.keys = pygame.key.get_pressed()
+            self.mouse_pos = pygame.mouse.get_pos()
+            events = pygame.event.get()
+            if self.recorder:
+                self.recorder.record(steps, self.mouse_pos, self.keys, events)
+
+        for _ in range(steps):
+            self.update(self.timestep)
+
+        self.event_loop(events)
+        self.draw(self.accumulator / self.timestep)
+        self.present()
+
 
 if __name__ == '__main__':
-    game = Game()
+    parser = argparse.ArgumentParser(description="We Haul")
+    parser.add_argument("--profile", metavar="FILE", help="stream per-frame profiling data to a .jsonl or .csv file")
+    parser.add_argument("--atlas-cache", metavar="DIR", help="save scaled spritesheets to DIR and reuse them on startup")
+    parser.add_argument("--seed", type=int, help="seed box placement and particles")
+    parser.add_argument("--record", metavar="FILE", help="record the session's seed and input to FILE")
+    parser.add_argument("--replay", metavar="FILE", help="play a recorded session back as fast as possible")
+    parser.add_argument("--headless", action="store_true",
+                        help="run a --replay without a window, sound or frame cap")
+    args = parser.parse_args()
+    if args.headless and not args.replay:
+        parser.error("--headless needs --replay, nobody could play the game without a window")
+
+    if args.replay:
+        replay = backend.systems.replay.Replay(args.replay)
+        game = Game(replay.header["resolution"], replay.header["sprite_scale"], False, args.atlas_cache, replay.seed,
+                    args.headless)
+        game.replay = replay
+    else:
+        seed = args.seed
+        if seed is None and args.record:
+            seed = random.randrange(2 ** 32)
+        game = Game(atlas_cache=args.atlas_cache, seed=seed, headless=args.headless)
+        if args.record:
+            game.record(args.record)
+
+    if args.profile:
+        game.profiler.open_stream(args.profile)
+        game.profiler.enable()
+    start = pygame.time.get_ticks()
     game.main_loop()
+    game.profiler.close_stream()
+
+    if game.recorder:
+        game.recorder.close(game.summary())
+    if game.replay:
+        reproduced = game.replay.matches(game.summary())
+        seconds = (pygame.time.get_ticks() - start) / 1000
+        print(f"replayed {game.replay.frames} frames in {seconds:.2f}s, "
+              f"{'reproduced' if reproduced else 'DIVERGED from'} the recorded session")
+        game.replay.close()
     pygame.quit()
     sys.exit()
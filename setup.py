@@ -15,7 +15,7 @@ exe_name = "We Haul"
 
 cx_Freeze.setup(
     name=exe_name,
-    options={"build_exe": {"packages": ["pygame", "extend", "backend.systems"],
+    options={"build_exe": {"packages": ["pygame", "numpy", "extend", "backend.systems"],
                            "includes": ["pygame"],
                            "include_files": ["assets/"]}},
     executables=[cx_Freeze.Executable("main.py", base=base, targetName=exe_name + extension)]